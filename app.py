@@ -1,16 +1,23 @@
 from flask import Flask
 from datetime import datetime, timedelta
+from threading import Lock
 from flask_jwt_extended import JWTManager
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from config import Config, TestingConfig
+from services.replica import RoutingSession, replica_router
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 jwt = JWTManager()
-migrate = Migrate()
+migrate = None
 
 def create_app(config_name=None):
+    global migrate
+    from dotenv import load_dotenv
+    # Load environment variables from .env file
+    load_dotenv()
+
     app = Flask(__name__)
+    from models.serializers import FastJSONProvider
+    app.json = FastJSONProvider(app)
 
     if config_name =='testing':
         app.config.from_object('config.TestingConfig')
@@ -18,19 +25,82 @@ def create_app(config_name=None):
         app.config.from_object('config.Config')
 
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=15)
+    app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=30)
     app.config['JWT_TIMEZONE'] = 'UTC'
 
+    if app.config['PROXY_FIX_X_FOR']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+
+    # Adds the replica binds, so it has to run before db.init_app
+    replica_router.init_app(app)
     db.init_app(app)
     jwt.init_app(app)
-    migrate.init_app(app, db)
+    if not app.config['LAZY_INIT']:
+        # Flask-Migrate pulls in alembic, which is only needed for `flask db`
+        from flask_migrate import Migrate
+        migrate = migrate or Migrate()
+        migrate.init_app(app, db)
 
-    from models import user, organisation
+    from models import user, organisation, token, audit, outbox
     from routes import auth, organisation
+    from services.hashing import hasher
+    from services.throttle import throttle
+    from services.identity_cache import identity_cache
+    from services.metrics import metrics
+    from services.query_budget import query_budget_checker
+    from services.revocation import revocation_list
+    from services.membership_claims import membership_claims
+    from services.user_search import prefix_index
+    from services.audit import audit_log
+    from services.org_cache import org_cache
+    from services.idempotency import idempotency_store
+
+    hasher.init_app(app)
+    throttle.init_app(app)
+    identity_cache.init_app(app)
+    metrics.init_app(app)
+    query_budget_checker.init_app(app)
+    revocation_list.init_app(app)
+    membership_claims.init_app(app)
+    prefix_index.init_app(app)
+    audit_log.init_app(app)
+    org_cache.init_app(app)
+    idempotency_store.init_app(app)
 
     app.register_blueprint(auth.app, url_prefix='/auth')
     app.register_blueprint(organisation.app, url_prefix='/api')
 
+    from cli import register_commands
+    register_commands(app)
+
     return app
+
+
+class LazyApp:
+    """WSGI entry point that builds the application on its first request.
+
+    Importing this module then only costs the Flask and SQLAlchemy imports;
+    config loading, model and route imports and engine creation happen
+    when the first request arrives.
+    """
+
+    def __init__(self, factory, *args):
+        self.factory = factory
+        self.args = args
+        self._app = None
+        self._lock = Lock()
+
+    def __call__(self, environ, start_response):
+        if self._app is None:
+            with self._lock:
+                if self._app is None:
+                    self._app = self.factory(*self.args)
+        return self._app(environ, start_response)
+
+
+# Entry point for Vercel and other WSGI servers
+app = LazyApp(create_app)
 """
 
 if __name__ == "__main__":
@@ -0,0 +1,61 @@
+"""Measure import time and time-to-first-response of app.py in fresh interpreters.
+
+Usage: python -m benchmarks.cold_start [--runs 10]
+
+Each run starts a new Python process and times:
+- importing app.py
+- the first request through the WSGI callable, which for the lazy entry
+  point includes building the application
+
+The first request is an unauthenticated GET /api/organisations. It is
+answered by flask_jwt_extended without touching the database, so the
+numbers reflect start-up cost rather than query latency. Eager mode
+calls create_app() with Flask-Migrate. Lazy mode uses the module-level
+LazyApp with APP_LAZY_INIT=1.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = r'''
+import json, os, sys, time
+start = time.perf_counter()
+import app as module
+imported = time.perf_counter()
+from werkzeug.test import Client
+target = module.app if sys.argv[1] == 'lazy' else module.create_app()
+response = Client(target).get('/api/organisations')
+done = time.perf_counter()
+assert response.status_code == 401, response.status_code
+print(json.dumps({'import_ms': (imported - start) * 1000, 'first_response_ms': (done - start) * 1000}))
+'''
+
+
+def measure(mode, runs):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environ = dict(os.environ, APP_LAZY_INIT='1' if mode == 'lazy' else '0')
+    environ.setdefault('JWT_SECRET_KEY', 'cold-start-benchmark-secret-key-0123456789')
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', PROBE, mode], cwd=root, env=environ,
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output))
+    return {
+        key: round(statistics.median(sample[key] for sample in samples), 1)
+        for key in ('import_ms', 'first_response_ms')
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+    print(json.dumps({'runs': args.runs, 'eager': measure('eager', args.runs), 'lazy': measure('lazy', args.runs)},
+                     indent=2))
+
+
+if __name__ == '__main__':
+    main()
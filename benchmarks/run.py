@@ -0,0 +1,207 @@
+"""Benchmark the auth and organisation endpoints and report latency as JSON.
+
+Usage:
+    python -m benchmarks.run --database-url URL --reset --users 10000 \
+        --requests 2000 --concurrency 8 --mode wsgi --output results.json \
+        --baseline baseline.json
+
+--database-url is required and never falls back to DATABASE_URL, so the
+application database is not benchmarked (or reset) by accident. Seeds
+the database (see benchmarks.seed) unless --no-seed is given, dropping
+all tables first with --reset, then drives each scenario through the Flask test client (--mode testclient)
+or a threaded local WSGI server (--mode wsgi). For every scenario it
+reports p50/p99 latency in milliseconds, requests per second and SQL
+statements per request. With --baseline, each result is compared with a
+stored run, and the exit status is non-zero if p50 latency regresses
+more than --max-regression percent.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class TestClientDriver:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        response = self.client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_json(silent=True)
+
+
+class WSGIDriver:
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.local = threading.local()
+
+    def request(self, method, path, body=None, token=None):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection('127.0.0.1', self.port)
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = conn.getresponse()
+        data = response.read()
+        return response.status, json.loads(data) if data else None
+
+    def close(self):
+        self.server.shutdown()
+
+
+def run_scenario(driver, engine, make_request, requests, concurrency):
+    from services.query_budget import count_queries
+
+    latencies = []
+    lock = threading.Lock()
+
+    def one(index):
+        method, path, body, token = make_request(index)
+        start = time.perf_counter()
+        status, _ = driver.request(method, path, body, token)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+        return status
+
+    with count_queries(engine) as statements:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            statuses = list(pool.map(one, range(requests)))
+        wall = time.perf_counter() - start
+
+    return {
+        'requests': requests,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'requests_per_second': round(requests / wall, 1),
+        'queries_per_request': round(len(statements) / requests, 2),
+        'errors': sum(1 for status in statuses if status >= 500),
+    }
+
+
+def scenarios(driver, accounts, rng):
+    """Build request factories for each benchmarked endpoint from (userId, email) pairs."""
+    from benchmarks.seed import PASSWORD
+
+    sample = rng.sample(accounts, min(len(accounts), 200))
+    tokens, orgs = [], []
+    for _, email in sample:
+        _, body = driver.request('POST', '/auth/login', {'email': email, 'password': PASSWORD})
+        tokens.append(body['data']['accessToken'])
+        _, body = driver.request('GET', '/api/organisations?limit=1', token=tokens[-1])
+        orgs.append(body['data']['organisations'][0]['orgId'])
+
+    def pick(i):
+        return i % len(sample)
+
+    run_id = int(time.time())
+    return {
+        'register': lambda i: ('POST', '/auth/register', {'firstName': 'Bench', 'lastName': 'Run',
+                                                          'email': f'run{run_id}-{i}@bench.example',
+                                                          'password': PASSWORD}, None),
+        'login': lambda i: ('POST', '/auth/login', {'email': sample[pick(i)][1], 'password': PASSWORD}, None),
+        'get_organisations': lambda i: ('GET', '/api/organisations', None, tokens[pick(i)]),
+        'get_organisation': lambda i: ('GET', f'/api/organisations/{orgs[pick(i)]}', None, tokens[pick(i)]),
+        'get_user': lambda i: ('GET', f'/api/users/{sample[pick(i)][0]}', None, tokens[pick(i)]),
+    }
+
+
+def compare(results, baseline, max_regression):
+    regressed = False
+    for name, result in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        change = (result['p50_ms'] - previous['p50_ms']) / previous['p50_ms'] * 100 if previous['p50_ms'] else 0.0
+        result['p50_change_pct'] = round(change, 1)
+        if change > max_regression:
+            regressed = True
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=1000, help='Requests per scenario.')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--mode', choices=['testclient', 'wsgi'], default='testclient')
+    parser.add_argument('--scenario', action='append', help='Run only these scenarios.')
+    parser.add_argument('--database-url', required=True, help='A disposable database; DATABASE_URL is not used.')
+    parser.add_argument('--no-seed', action='store_true', help='Reuse an already seeded database.')
+    parser.add_argument('--reset', action='store_true', help='Drop and recreate all tables before seeding.')
+    parser.add_argument('--output', help='Write the JSON report here as well as to stdout.')
+    parser.add_argument('--baseline', help='Compare against a previous JSON report.')
+    parser.add_argument('--max-regression', type=float, default=10.0)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url
+    from app import create_app, db
+    from benchmarks.seed import seed
+    from models.user import User
+    from services.throttle import throttle
+
+    app = create_app()
+    # Logins are replayed for the same few accounts, which would otherwise be throttled
+    throttle.enabled = False
+    rng = random.Random(42)
+
+    with app.app_context():
+        if args.no_seed:
+            rows = db.session.execute(db.select(User.userId, User.email).where(User.email.like('user%@bench.example')))
+            accounts = [(str(userId), email) for userId, email in rows]
+        else:
+            if args.reset:
+                db.drop_all()
+            db.create_all()
+            accounts = [(str(userId), f'user{index}@bench.example') for index, userId in enumerate(seed(db, args.users))]
+        engine = db.engine
+
+    driver = WSGIDriver(app) if args.mode == 'wsgi' else TestClientDriver(app)
+    try:
+        factories = scenarios(driver, accounts, rng)
+        results = {'mode': args.mode, 'users': len(accounts), 'concurrency': args.concurrency, 'scenarios': {}}
+        for name, factory in factories.items():
+            if args.scenario and name not in args.scenario:
+                continue
+            results['scenarios'][name] = run_scenario(driver, engine, factory, args.requests, args.concurrency)
+    finally:
+        if isinstance(driver, WSGIDriver):
+            driver.close()
+
+    regressed = False
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressed = compare(results, json.load(f), args.max_regression)
+
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == '__main__':
+    main()
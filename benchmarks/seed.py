@@ -0,0 +1,93 @@
+"""Seed a database with synthetic users, organisations and memberships.
+
+Usage: python -m benchmarks.seed --users 100000 [--database-url URL]
+
+Every user owns a default organisation, as with /auth/register. Extra
+memberships follow a heavy-tailed distribution: most users belong to a
+handful of organisations, a few belong to hundreds, and a few
+organisations are very large.
+"""
+import argparse
+import os
+import random
+import time
+
+PASSWORD = 'benchmark-password'
+
+
+def seed(db, users, max_memberships=500, batch_size=5000, rng=None):
+    """Insert ``users`` users with default orgs plus extra memberships. Returns the list of userIds."""
+    from werkzeug.security import generate_password_hash
+    from flask import current_app
+    from models import uuid7
+    from models.user import User, user_organisation
+    from models.organisation import Organisation
+
+    rng = rng or random.Random(42)
+    # One hash shared by every seeded user keeps seeding independent of KDF cost
+    password = generate_password_hash(PASSWORD, current_app.config['PASSWORD_HASH_METHOD'])
+    user_ids, org_ids = [], []
+
+    for start in range(0, users, batch_size):
+        user_rows, org_rows, member_rows = [], [], []
+        for index in range(start, min(start + batch_size, users)):
+            userId, orgId = uuid7(), uuid7()
+            user_rows.append({'userId': userId, 'firstName': f'User{index}', 'lastName': 'Bench',
+                              'email': f'user{index}@bench.example', 'password': password, 'phone': None})
+            org_rows.append({'orgId': orgId, 'name': f"User{index}'s Organisation", 'ownerId': userId})
+            member_rows.append({'userId': userId, 'orgId': orgId})
+            user_ids.append(userId)
+            org_ids.append(orgId)
+        db.session.execute(db.insert(User), user_rows)
+        db.session.execute(db.insert(Organisation), org_rows)
+        db.session.execute(user_organisation.insert(), member_rows)
+        db.session.commit()
+
+    # Pareto-distributed membership counts; organisations picked with a
+    # power-law bias towards the first (oldest, most popular) ones.
+    member_rows = []
+    for userId in user_ids:
+        count = min(int(rng.paretovariate(1.5)) - 1, max_memberships)
+        picked = {org_ids[min(int(len(org_ids) * rng.random() ** 3), len(org_ids) - 1)] for _ in range(count)}
+        member_rows.extend({'userId': userId, 'orgId': orgId} for orgId in picked)
+        if len(member_rows) >= batch_size:
+            _insert_memberships(db, member_rows)
+            member_rows = []
+    if member_rows:
+        _insert_memberships(db, member_rows)
+    return user_ids
+
+
+def _insert_memberships(db, rows):
+    from sqlalchemy.dialects import postgresql, sqlite
+    from models.user import user_organisation
+
+    dialect = sqlite if db.session.get_bind().dialect.name == 'sqlite' else postgresql
+    db.session.execute(dialect.insert(user_organisation).on_conflict_do_nothing(), rows)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--max-memberships', type=int, default=500)
+    parser.add_argument('--database-url', help='Defaults to DATABASE_URL.')
+    parser.add_argument('--reset', action='store_true', help='Drop and recreate all tables first.')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    from app import create_app, db
+
+    app = create_app()
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+        db.create_all()
+        start = time.perf_counter()
+        seed(db, args.users, args.max_memberships)
+        print(f'Seeded {args.users} users in {time.perf_counter() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
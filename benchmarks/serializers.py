@@ -0,0 +1,78 @@
+"""Compare organisation listing serialisation: ORM + stdlib json vs column rows + serializers.
+
+Usage: python -m benchmarks.serializers [--orgs 10000] [--repeat 20] [--database-url URL]
+
+The baseline reproduces the original get_organisations() path. It
+hydrates Organisation ORM objects, builds dicts by hand and encodes them
+with the stdlib JSON provider. The new path selects org_columns(),
+serializes with orgs_to_list and encodes with FastJSONProvider, which
+uses orjson when it is installed. Reports the median milliseconds per
+listing for each path as JSON. Defaults to an in-memory SQLite database.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+import uuid
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--orgs', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--database-url', default='sqlite://')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url
+    from flask.json.provider import DefaultJSONProvider
+    from app import create_app, db
+    from models.organisation import Organisation
+    from models.serializers import FastJSONProvider, org_columns, orgs_to_list, orjson
+    from models.user import User
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        ownerId = uuid.uuid4()
+        db.session.execute(db.insert(User).values(userId=ownerId, firstName='Bench', lastName='Owner',
+                                                  email=f'{ownerId}@bench.example', password='x'))
+        db.session.execute(db.insert(Organisation), [
+            {'orgId': uuid.uuid4(), 'name': f'Org {index}', 'description': 'Benchmark organisation', 'ownerId': ownerId}
+            for index in range(args.orgs)
+        ])
+        db.session.commit()
+
+        stdlib = DefaultJSONProvider(app)
+        fast = FastJSONProvider(app)
+
+        def orm_path():
+            orgs = Organisation.query.filter_by(ownerId=ownerId).all()
+            stdlib.dumps([{'orgId': str(org.orgId), 'name': org.name, 'description': org.description} for org in orgs])
+            db.session.expunge_all()
+
+        def column_path():
+            rows = db.session.execute(db.select(*org_columns()).where(Organisation.ownerId == ownerId)).all()
+            fast.dumps(orgs_to_list(rows))
+
+        results = {
+            'orgs': args.orgs,
+            'orjson': orjson is not None,
+            'orm_stdlib_ms': timed(orm_path, args.repeat),
+            'columns_serializer_ms': timed(column_path, args.repeat),
+        }
+        results['speedup'] = round(results['orm_stdlib_ms'] / results['columns_serializer_ms'], 2)
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
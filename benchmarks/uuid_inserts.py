@@ -0,0 +1,84 @@
+"""Compare insert throughput and primary key index size for uuid4 vs uuid7 keys.
+
+Usage: python -m benchmarks.uuid_inserts [--rows 200000] [--batch-size 5000] [--database-url URL]
+
+Creates two scratch tables shaped like ``user`` (a UUID primary key plus a
+few string columns), fills one with random uuid4 keys and the other with
+time-ordered uuid7 keys in batches of ``--batch-size``, and reports rows per
+second and the size of each primary key index as JSON. Index sizes come
+from pg_relation_size on PostgreSQL and the dbstat table on SQLite. The
+tables are dropped afterwards. Defaults to a temporary SQLite file.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import uuid
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--database-url', help='Defaults to a temporary SQLite file.')
+    args = parser.parse_args()
+
+    scratch = None
+    if not args.database_url:
+        scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        args.database_url = f'sqlite:///{scratch.name}'
+    os.environ['DATABASE_URL'] = args.database_url
+
+    from sqlalchemy.dialects.postgresql import UUID
+    from app import create_app, db
+    from models import uuid7
+
+    app = create_app()
+    with app.app_context():
+        metadata = db.MetaData()
+        tables = {
+            name: db.Table(f'bench_{name}', metadata,
+                           db.Column('id', UUID(as_uuid=True), primary_key=True),
+                           db.Column('firstName', db.String, nullable=False),
+                           db.Column('email', db.String, nullable=False))
+            for name in ('uuid4', 'uuid7')
+        }
+        generators = {'uuid4': uuid.uuid4, 'uuid7': uuid7}
+        metadata.drop_all(db.engine)
+        metadata.create_all(db.engine)
+
+        results = {'rows': args.rows, 'batchSize': args.batch_size, 'dialect': db.engine.dialect.name}
+        try:
+            for name, table in tables.items():
+                generate = generators[name]
+                start = time.perf_counter()
+                with db.engine.begin() as connection:
+                    for offset in range(0, args.rows, args.batch_size):
+                        connection.execute(table.insert(), [
+                            {'id': generate(), 'firstName': f'User{index}', 'email': f'user{index}@bench.example'}
+                            for index in range(offset, min(offset + args.batch_size, args.rows))
+                        ])
+                elapsed = time.perf_counter() - start
+                results[name] = {'rowsPerSecond': round(args.rows / elapsed), 'indexBytes': index_size(db, table)}
+        finally:
+            metadata.drop_all(db.engine)
+            if scratch is not None:
+                os.unlink(scratch.name)
+
+        results['insertSpeedup'] = round(results['uuid7']['rowsPerSecond'] / results['uuid4']['rowsPerSecond'], 2)
+        results['indexSizeRatio'] = round(results['uuid7']['indexBytes'] / results['uuid4']['indexBytes'], 2)
+        print(json.dumps(results, indent=2))
+
+
+def index_size(db, table):
+    with db.engine.connect() as connection:
+        if db.engine.dialect.name == 'postgresql':
+            return connection.execute(db.text('SELECT pg_relation_size(:name)'), {'name': f'{table.name}_pkey'}).scalar()
+        # SQLite keeps a non-integer primary key in an automatic index
+        return connection.execute(db.text('SELECT sum(pgsize) FROM dbstat WHERE name = :name'),
+                                  {'name': f'sqlite_autoindex_{table.name}_1'}).scalar()
+
+
+if __name__ == '__main__':
+    main()
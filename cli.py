@@ -0,0 +1,51 @@
+import json
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+
+@click.command('import-users')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(['jsonl', 'csv']), default=None,
+              help='Input format. Defaults to the file extension, or jsonl.')
+@click.option('--batch-size', type=int, default=None, help='Rows per INSERT batch.')
+@with_appcontext
+def import_users_command(source, fmt, batch_size):
+    """Bulk import users from a JSONL or CSV file (use - for stdin)."""
+    from services.bulk_import import iter_records, import_users
+    from services.hashing import hasher
+
+    if fmt is None:
+        fmt = 'csv' if source.name.endswith('.csv') else 'jsonl'
+    batch_size = batch_size or current_app.config['BULK_IMPORT_BATCH_SIZE']
+    # No logins compete with an offline import: keep every worker busy
+    try:
+        report = import_users(iter_records(source, fmt), batch_size, hash_window=hasher.workers)
+    except UnicodeDecodeError as error:
+        raise click.ClickException(f'{source.name} is not UTF-8 encoded: {error}')
+    click.echo(json.dumps(report, indent=2))
+
+
+@click.command('outbox-relay')
+@click.option('--sink', default=None, help='file:///path or http(s):// URL. Defaults to OUTBOX_SINK_URL.')
+@click.option('--workers', type=int, default=1, help='Concurrent relay workers.')
+@click.option('--batch-size', type=int, default=None, help='Events claimed per batch.')
+@click.option('--loop/--once', default=False, help='Keep polling instead of stopping once the outbox is empty.')
+@with_appcontext
+def outbox_relay_command(sink, workers, batch_size, loop):
+    """Deliver queued outbox events to a downstream sink."""
+    from services.outbox import make_sink, run_workers
+
+    config = current_app.config
+    sink = sink or config['OUTBOX_SINK_URL']
+    if not sink:
+        raise click.UsageError('Pass --sink or set OUTBOX_SINK_URL')
+    delivered = run_workers(current_app._get_current_object(), make_sink(sink, config['OUTBOX_HTTP_TIMEOUT']),
+                            workers=workers, batch_size=batch_size or config['OUTBOX_BATCH_SIZE'],
+                            loop=loop, poll_interval=config['OUTBOX_POLL_INTERVAL'])
+    click.echo(json.dumps({'delivered': delivered}))
+
+
+def register_commands(app):
+    app.cli.add_command(import_users_command)
+    app.cli.add_command(outbox_relay_command)
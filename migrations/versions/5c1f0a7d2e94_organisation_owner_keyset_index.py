@@ -0,0 +1,26 @@
+"""Add (ownerId, orgId) index for keyset pagination of organisations
+
+Revision ID: 5c1f0a7d2e94
+Revises: ba13a36af18b
+Create Date: 2026-10-18 12:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1f0a7d2e94'
+down_revision = 'ba13a36af18b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('organisation', schema=None) as batch_op:
+        batch_op.create_index('ix_organisation_ownerId_orgId', ['ownerId', 'orgId'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('organisation', schema=None) as batch_op:
+        batch_op.drop_index('ix_organisation_ownerId_orgId')
@@ -0,0 +1,37 @@
+"""Rename user_organisation columns to userId/orgId and key it on both
+
+Revision ID: 7a2c5e9d14b8
+Revises: 5c1f0a7d2e94
+Create Date: 2026-10-18 12:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a2c5e9d14b8'
+down_revision = '5c1f0a7d2e94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 23a8e50a37ce created the table as user_id/org_id with a primary key on
+    # user_id alone; the model (and ON CONFLICT in Organisation.add_members)
+    # expects camelCase columns and a (userId, orgId) key.
+    with op.batch_alter_table('user_organisation', schema=None) as batch_op:
+        batch_op.alter_column('user_id', new_column_name='userId', existing_type=sa.UUID(), existing_nullable=False)
+        batch_op.alter_column('org_id', new_column_name='orgId', existing_type=sa.UUID(), existing_nullable=False)
+        batch_op.drop_constraint('user_organisation_pkey', type_='primary')
+        batch_op.create_primary_key('user_organisation_pkey', ['userId', 'orgId'])
+
+
+def downgrade():
+    # Fails if a user belongs to more than one organisation, which the old
+    # user_id key cannot represent
+    with op.batch_alter_table('user_organisation', schema=None) as batch_op:
+        batch_op.drop_constraint('user_organisation_pkey', type_='primary')
+        batch_op.create_primary_key('user_organisation_pkey', ['userId'])
+        batch_op.alter_column('orgId', new_column_name='org_id', existing_type=sa.UUID(), existing_nullable=False)
+        batch_op.alter_column('userId', new_column_name='user_id', existing_type=sa.UUID(), existing_nullable=False)
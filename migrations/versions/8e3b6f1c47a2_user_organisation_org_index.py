@@ -0,0 +1,26 @@
+"""Add orgId index on user_organisation for membership checks
+
+Revision ID: 8e3b6f1c47a2
+Revises: 7a2c5e9d14b8
+Create Date: 2026-10-18 13:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e3b6f1c47a2'
+down_revision = '7a2c5e9d14b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user_organisation', schema=None) as batch_op:
+        batch_op.create_index('ix_user_organisation_orgId', ['orgId'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user_organisation', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_organisation_orgId')
@@ -0,0 +1,55 @@
+"""Time-ordered uuid_generate_v7() server defaults for user and organisation keys
+
+Revision ID: a6c1e4f92b07
+Revises: f5b8d3e6a924
+Create Date: 2026-10-18 17:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c1e4f92b07'
+down_revision = 'f5b8d3e6a924'
+branch_labels = None
+depends_on = None
+
+# The application generates ids with models.uuid7(); the server default only
+# covers rows inserted by other writers (psql, scripts). Existing v4 ids are
+# still valid uuids and stay as they are.
+UUID_GENERATE_V7 = """
+CREATE OR REPLACE FUNCTION uuid_generate_v7() RETURNS uuid AS $$
+DECLARE
+    uuid_bytes bytea := uuid_send(gen_random_uuid());
+BEGIN
+    -- Overwrite the first 48 bits with the Unix time in milliseconds
+    uuid_bytes := overlay(uuid_bytes placing
+        substring(int8send(floor(extract(epoch from clock_timestamp()) * 1000)::bigint) from 3)
+        from 1 for 6);
+    -- Turn the version nibble from 4 (0100) into 7 (0111); the variant bits are already set
+    uuid_bytes := set_bit(set_bit(uuid_bytes, 53, 1), 52, 1);
+    RETURN encode(uuid_bytes, 'hex')::uuid;
+END
+$$ LANGUAGE plpgsql VOLATILE
+"""
+
+KEYS = (('user', 'userId'), ('organisation', 'orgId'))
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute(UUID_GENERATE_V7)
+    for table, column in KEYS:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(column, server_default=sa.text('uuid_generate_v7()'))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table, column in KEYS:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(column, server_default=None)
+    op.execute('DROP FUNCTION IF EXISTS uuid_generate_v7()')
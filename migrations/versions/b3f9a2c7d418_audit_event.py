@@ -0,0 +1,40 @@
+"""Add audit_event table
+
+Revision ID: b3f9a2c7d418
+Revises: a6c1e4f92b07
+Create Date: 2026-10-18 17:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3f9a2c7d418'
+down_revision = 'a6c1e4f92b07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('audit_event',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+    sa.Column('event', sa.String(length=64), nullable=False),
+    sa.Column('userId', sa.UUID(), nullable=True),
+    sa.Column('ip', sa.String(length=45), nullable=True),
+    sa.Column('data', sa.JSON().with_variant(postgresql.JSONB(), 'postgresql'), nullable=True),
+    sa.Column('createdAt', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('audit_event', schema=None) as batch_op:
+        batch_op.create_index('ix_audit_event_userId_createdAt', ['userId', 'createdAt'], unique=False)
+        batch_op.create_index('ix_audit_event_createdAt', ['createdAt'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('audit_event', schema=None) as batch_op:
+        batch_op.drop_index('ix_audit_event_createdAt')
+        batch_op.drop_index('ix_audit_event_userId_createdAt')
+
+    op.drop_table('audit_event')
@@ -0,0 +1,30 @@
+"""Add user_organisation.createdAt for incremental member exports
+
+Revision ID: b7d24e9a0c31
+Revises: 8e3b6f1c47a2
+Create Date: 2026-10-18 13:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d24e9a0c31'
+down_revision = '8e3b6f1c47a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user_organisation', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('createdAt', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+        batch_op.drop_index('ix_user_organisation_orgId')
+        batch_op.create_index('ix_user_organisation_orgId_createdAt', ['orgId', 'createdAt'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user_organisation', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_organisation_orgId_createdAt')
+        batch_op.create_index('ix_user_organisation_orgId', ['orgId'], unique=False)
+        batch_op.drop_column('createdAt')
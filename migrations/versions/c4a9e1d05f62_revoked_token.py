@@ -0,0 +1,37 @@
+"""Add revoked_token table for refresh token rotation and logout
+
+Revision ID: c4a9e1d05f62
+Revises: b7d24e9a0c31
+Create Date: 2026-10-18 15:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a9e1d05f62'
+down_revision = 'b7d24e9a0c31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('revoked_token',
+    sa.Column('jti', sa.String(length=36), nullable=False),
+    sa.Column('tokenType', sa.String(length=10), nullable=False),
+    sa.Column('userId', sa.UUID(), nullable=False),
+    sa.Column('expiresAt', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('revokedAt', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['userId'], ['user.userId'], ),
+    sa.PrimaryKeyConstraint('jti')
+    )
+    with op.batch_alter_table('revoked_token', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_revoked_token_revokedAt'), ['revokedAt'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('revoked_token', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_revoked_token_revokedAt'))
+
+    op.drop_table('revoked_token')
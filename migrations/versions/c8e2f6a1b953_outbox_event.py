@@ -0,0 +1,31 @@
+"""Add outbox_event table for the transactional outbox
+
+Revision ID: c8e2f6a1b953
+Revises: b3f9a2c7d418
+Create Date: 2026-10-18 18:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e2f6a1b953'
+down_revision = 'b3f9a2c7d418'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('outbox_event',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+    sa.Column('topic', sa.String(length=64), nullable=False),
+    sa.Column('payload', sa.JSON().with_variant(postgresql.JSONB(), 'postgresql'), nullable=False),
+    sa.Column('createdAt', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('outbox_event')
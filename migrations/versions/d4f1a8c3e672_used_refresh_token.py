@@ -0,0 +1,36 @@
+"""Add used_refresh_token table for rotated refresh tokens
+
+Revision ID: d4f1a8c3e672
+Revises: c8e2f6a1b953
+Create Date: 2026-10-19 10:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f1a8c3e672'
+down_revision = 'c8e2f6a1b953'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('used_refresh_token',
+    sa.Column('jti', sa.String(length=36), nullable=False),
+    sa.Column('userId', sa.UUID(), nullable=False),
+    sa.Column('expiresAt', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('usedAt', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['userId'], ['user.userId'], ),
+    sa.PrimaryKeyConstraint('jti')
+    )
+    with op.batch_alter_table('used_refresh_token', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_used_refresh_token_expiresAt'), ['expiresAt'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('used_refresh_token', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_used_refresh_token_expiresAt'))
+
+    op.drop_table('used_refresh_token')
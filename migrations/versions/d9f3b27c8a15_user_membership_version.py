@@ -0,0 +1,26 @@
+"""Add user.membershipVersion for token membership claims
+
+Revision ID: d9f3b27c8a15
+Revises: c4a9e1d05f62
+Create Date: 2026-10-18 15:45:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9f3b27c8a15'
+down_revision = 'c4a9e1d05f62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('membershipVersion', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('membershipVersion')
@@ -0,0 +1,26 @@
+"""Add organisation.updatedAt for conditional GETs
+
+Revision ID: e2a7c5d81f36
+Revises: d9f3b27c8a15
+Create Date: 2026-10-18 16:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a7c5d81f36'
+down_revision = 'd9f3b27c8a15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('organisation', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updatedAt', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('organisation', schema=None) as batch_op:
+        batch_op.drop_column('updatedAt')
@@ -0,0 +1,42 @@
+"""Add case-insensitive and trigram indexes for user search
+
+Revision ID: f5b8d3e6a924
+Revises: e2a7c5d81f36
+Create Date: 2026-10-18 16:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5b8d3e6a924'
+down_revision = 'e2a7c5d81f36'
+branch_labels = None
+depends_on = None
+
+COLUMNS = ('email', 'firstName', 'lastName')
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        for column in COLUMNS:
+            op.create_index(f'ix_user_{column}_lower', 'user', [sa.text(f'lower("{column}")')], unique=False)
+        return
+
+    # text_pattern_ops lets LIKE 'q%' use the btree under any collation
+    for column in COLUMNS:
+        op.execute(f'CREATE INDEX "ix_user_{column}_lower" ON "user" (lower("{column}") text_pattern_ops)')
+
+    # Serves match=contains (LIKE '%q%'); each column of a multicolumn GIN
+    # index can be searched on its own
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute('CREATE INDEX ix_user_search_trgm ON "user" USING gin ('
+               + ', '.join(f'lower("{column}") gin_trgm_ops' for column in COLUMNS) + ')')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_user_search_trgm')
+    for column in COLUMNS:
+        op.drop_index(f'ix_user_{column}_lower', table_name='user')
@@ -0,0 +1,44 @@
+import os
+import threading
+import time
+import uuid
+
+_uuid7_lock = threading.Lock()
+_uuid7_last = (0, 0)
+
+
+def parse_uuid(value):
+    """Return ``value`` as a UUID, or None if it is not a valid UUID."""
+    if isinstance(value, uuid.UUID):
+        return value
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def uuid7():
+    """Return a time-ordered UUID (RFC 9562 version 7).
+
+    The first 48 bits are the Unix time in milliseconds, so new keys land at
+    the right-hand edge of the primary key B-tree instead of scattering
+    across it. Within one millisecond the 12-bit rand_a field is used as a
+    counter, seeded randomly, so ids from this process stay strictly
+    increasing.
+    """
+    global _uuid7_last
+    with _uuid7_lock:
+        millis = time.time_ns() // 1_000_000
+        last_millis, last_counter = _uuid7_last
+        if millis > last_millis:
+            counter = int.from_bytes(os.urandom(2), 'big') & 0x7FF
+        else:
+            # Same millisecond (or the clock went backwards): keep counting,
+            # borrowing the next millisecond when the counter runs out
+            millis, counter = last_millis, last_counter + 1
+            if counter > 0xFFF:
+                millis, counter = millis + 1, 0
+        _uuid7_last = (millis, counter)
+
+    rand_b = int.from_bytes(os.urandom(8), 'big') & ((1 << 62) - 1)
+    return uuid.UUID(int=(millis << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | rand_b)
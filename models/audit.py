@@ -0,0 +1,21 @@
+from app import db
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+
+
+class AuditEvent(db.Model):
+    # Written in batches by services.audit; userId is deliberately not a
+    # foreign key so the trail outlives the rows it describes
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    event = db.Column(db.String(64), nullable=False)
+    userId = db.Column(UUID(as_uuid=True))
+    ip = db.Column(db.String(45))
+    data = db.Column(db.JSON().with_variant(JSONB(), 'postgresql'))
+    createdAt = db.Column(db.DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_audit_event_userId_createdAt', 'userId', 'createdAt'),
+        db.Index('ix_audit_event_createdAt', 'createdAt'),
+    )
+
+    def __repr__(self):
+        return f"<AuditEvent {self.event} {self.userId}>"
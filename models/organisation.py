@@ -1,12 +1,138 @@
 from app import db
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.dialects.postgresql import UUID
-import uuid
+from models import uuid7
+from models.user import user_organisation
 
 class Organisation(db.Model):
-    orgId = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
+    __table_args__ = (
+        db.Index('ix_organisation_ownerId_orgId', 'ownerId', 'orgId'),
+    )
+
+    orgId = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid7, unique=True, nullable=False)
     name = db.Column(db.String, nullable=False)
     description = db.Column(db.String)
     ownerId = db.Column(UUID(as_uuid=True), db.ForeignKey('user.userId'), nullable=False)
+    updatedAt = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), onupdate=db.func.now(), nullable=False)
+
+    @classmethod
+    def page_for_user(cls, userId, limit, after=None):
+        """Return up to ``limit`` (orgId, name, description) rows visible to a user, ordered by orgId.
+
+        Owned and member organisations are merged with a UNION so duplicates
+        are removed by the database. Each branch applies the keyset condition
+        and limit itself, so both can be answered from the (ownerId, orgId)
+        index and the (userId, orgId) primary key of user_organisation.
+        """
+        owned = db.select(cls.orgId).where(cls.ownerId == userId)
+        member = db.select(user_organisation.c.orgId).where(user_organisation.c.userId == userId)
+        if after is not None:
+            owned = owned.where(cls.orgId > after)
+            member = member.where(user_organisation.c.orgId > after)
+        owned = owned.order_by(cls.orgId).limit(limit).subquery()
+        member = member.order_by(user_organisation.c.orgId).limit(limit).subquery()
+        visible = db.union(db.select(owned.c.orgId), db.select(member.c.orgId)).subquery()
+
+        stmt = (db.select(cls.orgId, cls.name, cls.description)
+                .join(visible, visible.c.orgId == cls.orgId)
+                .order_by(cls.orgId)
+                .limit(limit))
+        return db.session.execute(stmt).all()
+
+    @classmethod
+    def visible_ids(cls, userId, limit):
+        """Return up to ``limit`` orgIds the user owns or belongs to, in one UNION query."""
+        visible = db.union(
+            db.select(cls.orgId).where(cls.ownerId == userId),
+            db.select(user_organisation.c.orgId).where(user_organisation.c.userId == userId)
+        ).subquery()
+        return db.session.execute(db.select(visible.c.orgId).limit(limit)).scalars().all()
+
+    @classmethod
+    def last_updated(cls, userId=None, orgIds=None):
+        """Return the latest updatedAt among the organisations a user can see, or among ``orgIds``.
+
+        Used to build ETags without loading the listing itself.
+        """
+        if orgIds is not None:
+            stmt = db.select(db.func.max(cls.updatedAt)).where(cls.orgId.in_(list(orgIds)))
+        else:
+            visible = db.union(
+                db.select(cls.orgId).where(cls.ownerId == userId),
+                db.select(user_organisation.c.orgId).where(user_organisation.c.userId == userId)
+            ).subquery()
+            stmt = db.select(db.func.max(cls.updatedAt)).join(visible, visible.c.orgId == cls.orgId)
+        return db.session.execute(stmt).scalar()
+
+    @classmethod
+    def page_by_ids(cls, orgIds, limit, after=None):
+        """Like page_for_user, but for an already authorised set of orgIds."""
+        orgIds = sorted(orgId for orgId in orgIds if after is None or orgId > after)[:limit]
+        if not orgIds:
+            return []
+        stmt = db.select(cls.orgId, cls.name, cls.description).where(cls.orgId.in_(orgIds)).order_by(cls.orgId)
+        return db.session.execute(stmt).all()
+
+    @classmethod
+    def shared_between(cls, userId, otherId, limit, after=None):
+        """Return up to ``limit`` (orgId, name, description) rows both users are members of, ordered by orgId."""
+        mine = user_organisation.alias('mine')
+        theirs = user_organisation.alias('theirs')
+        stmt = (db.select(cls.orgId, cls.name, cls.description)
+                .join(mine, mine.c.orgId == cls.orgId)
+                .join(theirs, theirs.c.orgId == mine.c.orgId)
+                .where(mine.c.userId == userId, theirs.c.userId == otherId))
+        if after is not None:
+            stmt = stmt.where(mine.c.orgId > after)
+        return db.session.execute(stmt.order_by(mine.c.orgId).limit(limit)).all()
+
+    @classmethod
+    def _visible_clause(cls, userId):
+        membership = db.select(user_organisation.c.orgId).where(
+            user_organisation.c.userId == userId, user_organisation.c.orgId == cls.orgId)
+        return db.or_(cls.ownerId == userId, membership.exists())
+
+    @classmethod
+    def is_visible_to(cls, orgId, userId):
+        """Return True if the user owns or belongs to the organisation, using a single EXISTS query."""
+        stmt = db.select(db.select(cls.orgId).where(cls.orgId == orgId, cls._visible_clause(userId)).exists())
+        return db.session.execute(stmt).scalar()
+
+    @classmethod
+    def get_visible(cls, orgId, userId):
+        """Return the (orgId, name, description, ownerId, updatedAt) row if the user can see it, else None."""
+        stmt = (db.select(cls.orgId, cls.name, cls.description, cls.ownerId, cls.updatedAt)
+                .where(cls.orgId == orgId, cls._visible_clause(userId)))
+        return db.session.execute(stmt).first()
+
+    @staticmethod
+    def has_member(orgId, userId):
+        """Return True if the user is a member of the organisation."""
+        stmt = db.select(db.select(user_organisation.c.orgId).where(
+            user_organisation.c.userId == userId, user_organisation.c.orgId == orgId).exists())
+        return db.session.execute(stmt).scalar()
+
+    @staticmethod
+    def add_member(orgId, userId):
+        """Insert a membership row. The caller commits."""
+        db.session.execute(user_organisation.insert().values(userId=userId, orgId=orgId))
+
+    @staticmethod
+    def add_members(orgId, userIds):
+        """Insert memberships for many users at once, skipping existing ones.
+
+        Uses a single INSERT ... ON CONFLICT DO NOTHING RETURNING and returns
+        the set of userIds that were actually added. The caller commits.
+        """
+        userIds = list(dict.fromkeys(userIds))
+        if not userIds:
+            return set()
+        dialect = sqlite if db.session.get_bind().dialect.name == 'sqlite' else postgresql
+        stmt = (dialect.insert(user_organisation)
+                .values([{'userId': userId, 'orgId': orgId} for userId in userIds])
+                .on_conflict_do_nothing()
+                .returning(user_organisation.c.userId))
+        return set(db.session.execute(stmt).scalars())
 
     def __repr__(self):
         return f"<Organisation {self.name}>"
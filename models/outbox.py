@@ -0,0 +1,21 @@
+from app import db
+from sqlalchemy.dialects.postgresql import JSONB
+
+
+class OutboxEvent(db.Model):
+    # Written in the same transaction as the change it describes and
+    # deleted by services.outbox once delivered downstream
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    topic = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.JSON().with_variant(JSONB(), 'postgresql'), nullable=False)
+    createdAt = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), nullable=False)
+
+    @classmethod
+    def add(cls, topic, payloads):
+        """Queue one event per payload with a single INSERT. The caller commits."""
+        payloads = list(payloads)
+        if payloads:
+            db.session.execute(db.insert(cls), [{'topic': topic, 'payload': payload} for payload in payloads])
+
+    def __repr__(self):
+        return f"<OutboxEvent {self.id} {self.topic}>"
@@ -0,0 +1,62 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def user_columns():
+    """Columns needed to serialize a user, for column-only selects."""
+    from models.user import User
+    return (User.userId, User.firstName, User.lastName, User.email, User.phone)
+
+
+def org_columns():
+    """Columns needed to serialize an organisation, for column-only selects."""
+    from models.organisation import Organisation
+    return (Organisation.orgId, Organisation.name, Organisation.description)
+
+
+def user_to_dict(row):
+    """Serialize anything with User's public columns as attributes: a result row, an Identity or a User."""
+    return {
+        'userId': str(row.userId),
+        'firstName': row.firstName,
+        'lastName': row.lastName,
+        'email': row.email,
+        'phone': row.phone
+    }
+
+
+def org_to_dict(row):
+    """Serialize anything with Organisation's public columns as attributes."""
+    return {'orgId': str(row.orgId), 'name': row.name, 'description': row.description}
+
+
+def orgs_to_list(rows):
+    # Positional access avoids per-attribute lookups on large listings;
+    # rows must come from a select of org_columns().
+    return [{'orgId': str(orgId), 'name': name, 'description': description}
+            for orgId, name, description in rows]
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that uses orjson when it is installed.
+
+    Falls back to the default provider for anything orjson cannot encode and
+    whenever extra json.dumps keyword arguments are passed.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
@@ -0,0 +1,25 @@
+from app import db
+from sqlalchemy.dialects.postgresql import UUID
+
+
+class RevokedToken(db.Model):
+    jti = db.Column(db.String(36), primary_key=True)
+    tokenType = db.Column(db.String(10), nullable=False)
+    userId = db.Column(UUID(as_uuid=True), db.ForeignKey('user.userId'), nullable=False)
+    expiresAt = db.Column(db.DateTime(timezone=True), nullable=False)
+    revokedAt = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<RevokedToken {self.jti}>"
+
+
+class UsedRefreshToken(db.Model):
+    """A refresh token that has been exchanged. Only /auth/refresh writes here, and
+    the jti primary key is what rejects a second use."""
+    jti = db.Column(db.String(36), primary_key=True)
+    userId = db.Column(UUID(as_uuid=True), db.ForeignKey('user.userId'), nullable=False)
+    expiresAt = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
+    usedAt = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<UsedRefreshToken {self.jti}>"
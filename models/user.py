@@ -1,26 +1,165 @@
 from app import db
 from sqlalchemy.dialects.postgresql import UUID
-import uuid
+from models import uuid7
 
 user_organisation = db.Table('user_organisation',
     db.Column('userId', UUID(as_uuid=True), db.ForeignKey('user.userId'), primary_key=True),
-    db.Column('orgId', UUID(as_uuid=True), db.ForeignKey('organisation.orgId'), primary_key=True)
+    db.Column('orgId', UUID(as_uuid=True), db.ForeignKey('organisation.orgId'), primary_key=True),
+    db.Column('createdAt', db.DateTime(timezone=True), server_default=db.func.now(), nullable=False),
+    # The (userId, orgId) primary key serves per-user lookups; this one serves
+    # per-org lookups and incremental member exports
+    db.Index('ix_user_organisation_orgId_createdAt', 'orgId', 'createdAt')
 )
 
 
+def validate_registration(data):
+    """Return the list of field errors for a registration payload, empty if valid."""
+    errors = []
+    if not data.get('firstName'):
+        errors.append({'field': 'firstName', 'message': 'First name is required'})
+    if not data.get('lastName'):
+        errors.append({'field': 'lastName', 'message': 'Last name is required'})
+    if not data.get('email'):
+        errors.append({'field': 'email', 'message': 'Email is required'})
+    if not data.get('password'):
+        errors.append({'field': 'password', 'message': 'Password is required'})
+    for field, label in (('firstName', 'First name'), ('lastName', 'Last name'), ('email', 'Email'),
+                         ('password', 'Password'), ('phone', 'Phone')):
+        if data.get(field) is not None and not isinstance(data[field], str):
+            errors.append({'field': field, 'message': '%s must be a string' % label})
+    return errors
+
+
+def like_escape(value):
+    """Escape LIKE wildcards so user input matches literally (use with escape='!').
+
+    '!' rather than a backslash avoids backslash quoting differences between drivers.
+    """
+    return value.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+
+
 class User(db.Model):
 
-    userId = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4,
+    userId = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid7,
                        unique=True, nullable=False)
     firstName = db.Column(db.String, nullable=False)
     lastName = db.Column(db.String, nullable=False)
     email = db.Column(db.String, unique=True, nullable=False)
     password = db.Column(db.String, nullable=False)
     phone = db.Column(db.String)
+    # Bumped whenever the user's organisation memberships change; used to
+    # detect stale membership claims in access tokens
+    membershipVersion = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     owned_organisations = db.relationship('Organisation', backref='owner', lazy=True)
-    organisations = db.relationship('Organisation', secondary=user_organisation, lazy='subquery',
+    organisations = db.relationship('Organisation', secondary=user_organisation, lazy='select',
         backref=db.backref('users', lazy=True))
 
+    # Case-insensitive prefix search (LIKE 'q%' on lower(...)); text_pattern_ops
+    # lets PostgreSQL use the btree for LIKE under any collation. Substring
+    # search uses the pg_trgm GIN index ix_user_search_trgm, which only the
+    # migration creates because it needs the extension.
+    __table_args__ = (
+        db.Index('ix_user_email_lower', db.func.lower(email).label('email_lower'),
+                 postgresql_ops={'email_lower': 'text_pattern_ops'}),
+        db.Index('ix_user_firstName_lower', db.func.lower(firstName).label('firstName_lower'),
+                 postgresql_ops={'firstName_lower': 'text_pattern_ops'}),
+        db.Index('ix_user_lastName_lower', db.func.lower(lastName).label('lastName_lower'),
+                 postgresql_ops={'lastName_lower': 'text_pattern_ops'}),
+    )
+
+
+    @classmethod
+    def register(cls, firstName, lastName, email, password, phone=None):
+        """Insert a user, their default organisation and the membership row.
+
+        On PostgreSQL this is a single statement: the user and organisation
+        INSERTs are chained through data-modifying CTEs with RETURNING. Other
+        databases get three INSERTs. Duplicate emails surface as an
+        IntegrityError from the unique constraint; the caller commits or
+        rolls back. Returns the new (userId, orgId).
+        """
+        from models.organisation import Organisation
+
+        userId, orgId = uuid7(), uuid7()
+        org_name = f"{firstName}'s Organisation"
+        user_values = {'userId': userId, 'firstName': firstName, 'lastName': lastName,
+                       'email': email, 'password': password, 'phone': phone}
+
+        if db.session.get_bind().dialect.name != 'postgresql':
+            db.session.execute(db.insert(cls).values(**user_values))
+            db.session.execute(db.insert(Organisation).values(orgId=orgId, name=org_name, ownerId=userId))
+            db.session.execute(user_organisation.insert().values(userId=userId, orgId=orgId))
+            return userId, orgId
+
+        new_user = db.insert(cls).values(**user_values).returning(cls.userId).cte('new_user')
+        new_org = (db.insert(Organisation)
+                   .from_select(['orgId', 'name', 'ownerId'],
+                                db.select(db.literal(orgId, UUID(as_uuid=True)), db.literal(org_name), new_user.c.userId))
+                   .returning(Organisation.orgId, Organisation.ownerId)
+                   .cte('new_org'))
+        db.session.execute(user_organisation.insert().from_select(
+            ['userId', 'orgId'], db.select(new_org.c.ownerId, new_org.c.orgId)))
+        return userId, orgId
+
+    @classmethod
+    def bump_membership_version(cls, userIds):
+        """Increment membershipVersion for the given users in one UPDATE. The caller commits."""
+        userIds = list(userIds)
+        if userIds:
+            db.session.execute(db.update(cls).where(cls.userId.in_(userIds))
+                               .values(membershipVersion=cls.membershipVersion + 1))
+
+    @classmethod
+    def search(cls, q, match='prefix', limit=20, after=None, member_of=None):
+        """Case-insensitive search over email, firstName and lastName.
+
+        ``match`` is 'prefix', 'contains' or 'exact' (the whole email only).
+        With ``member_of``, only users sharing an organisation with that
+        userId are returned. Results are ordered by (lower(email), userId)
+        and keyset paginated with ``after``, a tuple of those two values.
+        Returns rows of (userId, firstName, lastName, email, emailKey).
+        """
+        email_key = db.func.lower(cls.email)
+        if match == 'exact':
+            condition = email_key == q.lower()
+        else:
+            term = like_escape(q.lower())
+            pattern = term + '%' if match == 'prefix' else '%' + term + '%'
+            condition = db.or_(email_key.like(pattern, escape='!'),
+                               db.func.lower(cls.firstName).like(pattern, escape='!'),
+                               db.func.lower(cls.lastName).like(pattern, escape='!'))
+        stmt = (db.select(cls.userId, cls.firstName, cls.lastName, cls.email, email_key.label('emailKey'))
+                .where(condition)
+                .order_by(email_key, cls.userId)
+                .limit(limit))
+        if member_of is not None:
+            stmt = stmt.where(cls.userId.in_(cls.co_members(member_of)))
+        if after is not None:
+            stmt = stmt.where(db.tuple_(email_key, cls.userId) > db.tuple_(*after))
+        return db.session.execute(stmt).all()
+
+    @staticmethod
+    def co_members(userId):
+        """SELECT of the userIds sharing an organisation with ``userId``, including ``userId``."""
+        mine = user_organisation.alias('mine')
+        theirs = user_organisation.alias('theirs')
+        return (db.select(theirs.c.userId)
+                .join(mine, mine.c.orgId == theirs.c.orgId)
+                .where(mine.c.userId == userId))
+
+    @staticmethod
+    def shares_organisation(userId, otherId):
+        """Return True if both users belong to at least one common organisation.
+
+        Self-joins user_organisation so the check is a single EXISTS that
+        stops at the first shared orgId.
+        """
+        mine = user_organisation.alias('mine')
+        theirs = user_organisation.alias('theirs')
+        shared = (db.select(mine.c.orgId)
+                  .join(theirs, theirs.c.orgId == mine.c.orgId)
+                  .where(mine.c.userId == userId, theirs.c.userId == otherId))
+        return db.session.execute(db.select(shared.exists())).scalar()
 
     def __repr__(self):
         return f"<User {self.userId}>"
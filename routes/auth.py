@@ -1,96 +1,172 @@
 
 from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
-from flask_jwt_extended import create_access_token, jwt_required
+from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt, jwt_required
+from sqlalchemy.exc import IntegrityError
 from app import db
 from datetime import datetime, timedelta
-from models.user import User
-from models.organisation import Organisation
+from models.user import User, validate_registration
+from models.outbox import OutboxEvent
+from models.serializers import user_columns, user_to_dict
+from services.hashing import hasher, HashingBusy
+from services.throttle import throttle
+from services.identity_cache import identity_cache
+from services.revocation import revocation_list
+from services.membership_claims import membership_claims
+from services.user_search import prefix_index
+from services.query_budget import query_budget
+from services.replica import replica_router
+from services.audit import audit_log
+from services.idempotency import idempotent
 
 app = Blueprint('auth', __name__)
 
+
+@app.errorhandler(HashingBusy)
+def hashing_busy(error):
+    return jsonify({'status': 'Service unavailable', 'message': 'Server is busy, please retry', 'statusCode': 503}), 503, {'Retry-After': '1'}
+
+
 @app.route('/register', methods=['POST'])
+@query_budget(4)
+@idempotent
 def register():
     """This function handles the user registration and validates data. """
     data = request.get_json()
-    errors = []
-    if not data.get('firstName'):
-        errors.append({'field': 'firstName', 'message': 'First name is required'})
-    if not data.get('lastName'):
-        errors.append({'field': 'lastName', 'message': 'Last name is required'})
-    if not data.get('email'):
-        errors.append({'field': 'email', 'message': 'Email is required'})
-    if not data.get('password'):
-        errors.append({'field': 'password', 'message': 'Password is required'})
+    errors = validate_registration(data)
 
     if errors:
-        return jsonify({'errors': errors}), 422                                                 
-    # Check for existing user
-    if User.query.filter_by(email=data['email']).first():
-        return jsonify({'status': 'Bad request', 'message': 'Registration unsuccessful', 'errors': [{'field': 'email', 'message': 'Email already exists'}], 'statusCode': 400}), 400
-
-    # Create new user
-    new_user = User(
-        firstName=data['firstName'],
-        lastName=data['lastName'],
-        email=data['email'],
-        password=generate_password_hash(data['password']),
-        phone=data.get('phone')
-    )
-
-    db.session.add(new_user)
-    db.session.flush()
-
-    # Create default organisation
-    new_org = Organisation(
-        name=f"{data['firstName']}'s Organisation",
-        ownerId=new_user.userId
-    )
+        return jsonify({'errors': errors}), 422
 
-    db.session.add(new_org)
-    new_user.organisations.append(new_org)
-    db.session.commit()
+    # Create the user, default organisation, membership and outbox event in one transaction;
+    # the unique constraint on user.email catches duplicates, including races.
+    try:
+        userId, orgId = User.register(
+            firstName=data['firstName'],
+            lastName=data['lastName'],
+            email=data['email'],
+            password=hasher.hash(data['password']),
+            phone=data.get('phone')
+        )
+        OutboxEvent.add('user.registered', [{
+            'userId': str(userId), 'orgId': str(orgId), 'email': data['email'],
+            'firstName': data['firstName'], 'lastName': data['lastName']
+        }])
+        db.session.commit()
+    except IntegrityError as error:
+        db.session.rollback()
+        if 'email' not in str(error.orig):
+            raise
+        return jsonify({'status': 'Bad request', 'message': 'Registration unsuccessful', 'errors': [{'field': 'email', 'message': 'Email already exists'}], 'statusCode': 400}), 400
+    identity_cache.invalidate(userId)
+    prefix_index.add(userId, data['firstName'], data['lastName'], data['email'])
+    # The new user's first reads must not race replication
+    replica_router.stick(userId)
+    audit_log.emit('user.registered', userId, orgId=str(orgId))
 
-    # Generate access token
-    access_token = create_access_token(identity=str(new_user.userId))
+    # Generate access and refresh tokens
+    claims = membership_claims.build(userId, 0, [orgId])
+    access_token = create_access_token(identity=str(userId), additional_claims=claims)
+    refresh_token = create_refresh_token(identity=str(userId))
 
     return jsonify({
         'status': 'success',
         'message': 'Registration successful',
         'data': {
             'accessToken': access_token,
+            'refreshToken': refresh_token,
             'user': {
-                'userId': str(new_user.userId),
-                'firstName': new_user.firstName,
-                'lastName': new_user.lastName,
-                'email': new_user.email,
-                'phone': new_user.phone
+                'userId': str(userId),
+                'firstName': data['firstName'],
+                'lastName': data['lastName'],
+                'email': data['email'],
+                'phone': data.get('phone')
             }
         }
     }), 201
 
 
 @app.route('/login', methods=['POST'])
+@query_budget(3)
 def login():
     data = request.get_json()
-    user = User.query.filter_by(email=data['email']).first()
 
-    if not user or not check_password_hash(user.password, data['password']):
+    # Shed throttled attempts before any database or hashing work
+    if not throttle.allow(data.get('email'), request.remote_addr):
+        audit_log.emit('login.throttled', email=data.get('email'))
+        return jsonify({'status': 'Too many requests', 'message': 'Too many login attempts, please retry later', 'statusCode': 429}), 429
+
+    # Select only the columns needed; no ORM instance is hydrated
+    user = db.session.execute(
+        db.select(*user_columns(), User.password, User.membershipVersion).where(User.email == data['email'])
+    ).first()
+
+    if not user or not hasher.verify(user.password, data['password']):
+        audit_log.emit('login.failed', user.userId if user else None, email=data['email'])
         return jsonify({'status': 'Bad request', 'message': 'Authentication failed', 'statusCode': 401}), 401
 
-    access_token = create_access_token(identity=user.userId)
+    # Upgrade hashes created with older cost parameters
+    if hasher.needs_rehash(user.password):
+        db.session.execute(db.update(User).where(User.userId == user.userId)
+                           .values(password=hasher.hash(data['password'])))
+        db.session.commit()
+
+    audit_log.emit('login.succeeded', user.userId)
+    user_data = user_to_dict(user)
+    claims = membership_claims.build(user.userId, user.membershipVersion)
+    access_token = create_access_token(identity=user_data['userId'], additional_claims=claims)
+    refresh_token = create_refresh_token(identity=user_data['userId'])
 
     return jsonify({
         'status': 'success',
         'message': 'Login successful',
         'data': {
             'accessToken': access_token,
-            'user': {
-                'userId': str(user.userId),
-                'firstName': user.firstName,
-                'lastName': user.lastName,
-                'email': user.email,
-                'phone': user.phone
-            }
+            'refreshToken': refresh_token,
+            'user': user_data
         }
     }), 200
+
+
+@app.route('/refresh', methods=['POST'])
+@query_budget(3)
+@jwt_required(refresh=True)
+def refresh():
+    """Exchange a refresh token for a new access token, rotating the refresh token."""
+    payload = get_jwt()
+
+    # Recording the presented token makes it single-use; a concurrent or
+    # replayed refresh with the same token hits the jti primary key.
+    try:
+        revocation_list.use_refresh_token(payload)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'status': 'Bad request', 'message': 'Refresh token already used', 'statusCode': 401}), 401
+
+    identity = identity_cache.get(payload['sub'])
+    if not identity:
+        return jsonify({'status': 'Bad request', 'message': 'User not found', 'statusCode': 404})
+    claims = membership_claims.build(identity.userId, identity.membershipVersion)
+
+    return jsonify({
+        'status': 'success',
+        'message': 'Token refreshed',
+        'data': {
+            'accessToken': create_access_token(identity=payload['sub'], additional_claims=claims),
+            'refreshToken': create_refresh_token(identity=payload['sub'])
+        }
+    }), 200
+
+
+@app.route('/logout', methods=['POST'])
+@query_budget(1)
+@jwt_required(verify_type=False)
+def logout():
+    """Revoke the presented access or refresh token."""
+    try:
+        revocation_list.revoke(get_jwt())
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+
+    return jsonify({'status': 'success', 'message': 'Logout successful'}), 200
@@ -1,60 +1,157 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
+from models import parse_uuid
 from models.organisation import Organisation
-from models.user import User
+from models.outbox import OutboxEvent
+from models.serializers import user_columns, user_to_dict, org_to_dict, orgs_to_list
+from models.user import User, user_organisation
 from sqlalchemy.orm import Session
+from datetime import datetime, timezone
+import hashlib
+import io
+from itertools import islice
+from services.identity_cache import identity_cache
+from services.membership_claims import membership_claims
+from services.query_budget import query_budget
+from services.replica import replica_reads, replica_router
+from services.audit import audit_log
+from services.org_cache import org_cache
+from services.idempotency import idempotent
+from services.bulk_import import iter_records, import_users
+from services.user_search import prefix_index, encode_cursor, decode_cursor
 
 session = Session()
 app = Blueprint('organisation', __name__)
 
+
+def page_args():
+    """Parse the limit/cursor query parameters. Returns (limit, after, errors)."""
+    errors = []
+    max_limit = current_app.config['ORGANISATIONS_PAGE_SIZE_MAX']
+    limit = request.args.get('limit', current_app.config['ORGANISATIONS_PAGE_SIZE'], type=int)
+    if limit is None or not 1 <= limit <= max_limit:
+        errors.append({'field': 'limit', 'message': 'Limit must be between 1 and %d' % max_limit})
+    cursor = request.args.get('cursor')
+    after = parse_uuid(cursor) if cursor else None
+    if cursor and after is None:
+        errors.append({'field': 'cursor', 'message': 'Invalid cursor'})
+    return limit, after, errors
+
+
+def make_etag(*parts):
+    """Hash the values a response depends on into a short strong ETag."""
+    return hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+
+
+def not_modified(etag):
+    """Return a bodyless 304 if the client already holds ``etag``, else None."""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    return response
+
+
+def org_page(rows, limit):
+    """Serialize a page fetched with limit + 1 rows. Returns (org_list, next_cursor)."""
+    next_cursor = str(rows[limit - 1].orgId) if len(rows) > limit else None
+    return orgs_to_list(rows[:limit]), next_cursor
+
+
 @app.route('/organisations', methods=['GET'])
+@query_budget(3)
 @jwt_required()
+@replica_reads
 def get_organisations():
     userId = get_jwt_identity()
-    user = db.session.get(User, userId)
+    identity = identity_cache.get(userId)
     # org = db.session.get(Organisation, orgId)
 
-    if not user:
+    if not identity:
         return jsonify({'status': 'Bad request', 'message': 'User not found', 'statusCode': 404})
 
-    all_orgs = set(user.owned_organisations + user.organisations)
-    org_list = [{'orgId': str(org.orgId), 'name': org.name, 'description': org.description} for org in all_orgs]
-
-    return jsonify({'status': 'success', 'message': 'Organisations retrieved', 'data': {'organisations': org_list}}), 200
+    limit, after, errors = page_args()
+    if errors:
+        return jsonify({'errors': errors}), 422
+
+    # The listing only changes when the user's memberships change (membershipVersion)
+    # or one of the visible organisations is updated, so a single aggregate is
+    # enough to answer a poll without loading the page.
+    org_ids = membership_claims.org_ids(identity)
+    if org_ids is not None:
+        last_updated = Organisation.last_updated(orgIds=org_ids)
+    else:
+        last_updated = Organisation.last_updated(identity.userId)
+    etag = make_etag(identity.userId, identity.membershipVersion, last_updated, limit, after)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    # Fetch one extra row to know whether another page exists
+    if org_ids is not None:
+        rows = Organisation.page_by_ids(org_ids, limit + 1, after)
+    else:
+        rows = Organisation.page_for_user(identity.userId, limit + 1, after)
+    org_list, next_cursor = org_page(rows, limit)
+
+    response = jsonify({'status': 'success', 'message': 'Organisations retrieved', 'data': {'organisations': org_list, 'nextCursor': next_cursor}})
+    return with_etag(response, etag), 200
 
 
 @app.route('/organisations/<orgId>', methods=['GET'])
+@query_budget(2)
 @jwt_required()
+@replica_reads
 def get_organisation(orgId):
     userId = get_jwt_identity()
-    user = db.session.get(User, userId)
+    identity = identity_cache.get(userId)
 
-    if not user:
+    if not identity:
         return jsonify({'status': 'Bad request', 'message': 'User not found', 'statusCode': 404})
 
-    org = db.session.get(Organisation, orgId)
-    if not org or (org not in user.owned_organisations and org not in user.organisations):
+    org_uuid = parse_uuid(orgId)
+    org_ids = membership_claims.org_ids(identity)
+    if org_ids is not None:
+        # The token's membership claim is current, so it settles access
+        org = org_cache.get(org_uuid) if org_uuid in org_ids else None
+    else:
+        row = Organisation.get_visible(org_uuid, identity.userId)
+        org = org_cache.put(row) if row else None
+    if not org:
         return jsonify({'status': 'Bad request', 'message': 'Organisation not found or access denied', 'statusCode': 404}), 404
 
-    return jsonify({'status': 'success', 'message': 'Organisation retrieved', 'data': {'orgId': str(org.orgId), 'name': org.name, 'description': org.description}}), 200
+    etag = make_etag(org.orgId, org.updatedAt)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    response = jsonify({'status': 'success', 'message': 'Organisation retrieved', 'data': org_to_dict(org)})
+    return with_etag(response, etag), 200
 
 
 @app.route('/organisations', methods=['POST'])
+@query_budget(5)
 @jwt_required()
+@idempotent
 def create_organisation():
     data = request.get_json()
     userId = get_jwt_identity()
-    user = db.session.get(User, userId)
+    identity = identity_cache.get(userId)
 
-    if not user:
+    if not identity:
         return jsonify({'status': 'Bad request', 'message': 'User not found', 'statusCode': 404})
 
     # Validate data
     if not data.get('name'):
         return jsonify({'errors': [{'field': 'name', 'message': 'Name is required'}]}), 422
 
-    existing_org = Organisation.query.filter_by(name=data['name'], ownerId=userId).first()
+    existing_org = Organisation.query.filter_by(name=data['name'], ownerId=identity.userId).first()
     if existing_org:
         return jsonify({'status': 'Bad request', 'message': 'Organisation with this name already exists', 'statusCode': 400})
 
@@ -62,90 +159,290 @@ def create_organisation():
     new_org = Organisation(
         name=data['name'],
         description=data.get('description'),
-        ownerId=userId
+        ownerId=identity.userId
     )
 
     db.session.add(new_org)
-    if new_org not in user.organisations:
-        user.organisations.append(new_org)
-        db.session.commit()
+    db.session.flush()
+    Organisation.add_member(new_org.orgId, identity.userId)
+    # Read the values before commit expires the instance
+    User.bump_membership_version([identity.userId])
+    org_data = org_to_dict(new_org)
+    db.session.commit()
+    identity_cache.invalidate(identity.userId)
+    org_cache.invalidate(org_data['orgId'])
+    audit_log.emit('organisation.created', identity.userId, orgId=org_data['orgId'])
 
     return jsonify({
         'status': 'success',
         'message': 'Organisation created successfully',
-        'data': {
-            'orgId': str(new_org.orgId),
-            'name': new_org.name,
-            'description': new_org.description
-        }
+        'data': org_data
     }), 201
 
 
 @app.route('/organisations/<orgId>/users', methods=['POST'])
+@query_budget(6)
 @jwt_required()
 def add_user_to_organisation(orgId):
     data = request.get_json()
     userId = get_jwt_identity()
 
-    logging.info(f"Request by userId: {userId} to add user: {data['userId']} to organisation: {orgId}")
-
     # Validate user_id
-    user = User.query.get(data['userId'])
+    user = identity_cache.get(data['userId'])
     if not user:
-        logging.error(f"User not found: {data['userId']}")
+        audit_log.emit('membership.add_failed', userId, orgId=orgId, memberId=data['userId'], reason='user_not_found')
         return jsonify({'errors': [{'field': 'userId', 'message': 'User not found'}]}), 422
 
     # Validate organisation
-    org = db.session.get(Organisation, orgId)
+    org = org_cache.get(orgId)
     if not org:
-        logging.error(f"Organisation not found: {orgId}")
+        audit_log.emit('membership.add_failed', userId, orgId=orgId, memberId=data['userId'], reason='organisation_not_found')
         return jsonify({'errors': [{'field': 'userId', 'message': 'User not found'}]}), 422
-    logging.info(f"Organisation ownerId: {org.ownerId}")
 
     if str(org.ownerId) != str(userId):
-        logging.error(f"Access denied for userId: {userId} on organisation: {orgId}")
+        audit_log.emit('membership.add_failed', userId, orgId=orgId, memberId=data['userId'], reason='access_denied')
         return jsonify({'status': 'Bad request', 'message': 'Organisation not found or access denied', 'statusCode': 404})
 
-    if org.org.users:
-        logging.warning(f"User already in organisation: {orgId}")
-        return jsonify({'status': 'Bad request', 'message': 'User already in organisation', 'statusCode': 400})
-
-    if user in org.users:
-        logging.warning(f"User already in organisation: {orgId}")
+    if Organisation.has_member(org.orgId, user.userId):
+        audit_log.emit('membership.add_failed', userId, orgId=orgId, memberId=data['userId'], reason='already_member')
         return jsonify({'status': 'Bad request', 'message': 'User already in organisation', 'statusCode': 400})
 
-    org.users.append(user)
+    Organisation.add_member(org.orgId, user.userId)
+    User.bump_membership_version([user.userId])
+    OutboxEvent.add('membership.added', [{'orgId': str(org.orgId), 'userId': str(user.userId), 'addedBy': str(userId)}])
     db.session.commit()
+    identity_cache.invalidate(user.userId)
+    # The new member's next reads must see the bumped membershipVersion
+    replica_router.stick(user.userId)
 
-    logging.info(f"User {data['userId']} added to organisation {orgId}")
+    audit_log.emit('membership.added', userId, orgId=orgId, memberId=data['userId'])
     return jsonify({'status': 'success', 'message': 'User added to organisation successfully'}), 200
 
+@app.route('/organisations/<orgId>/users/batch', methods=['POST'])
+@query_budget(5)
+@jwt_required()
+def add_users_to_organisation(orgId):
+    """Add many users to an organisation in one transaction, returning a status per userId."""
+    data = request.get_json()
+    userId = get_jwt_identity()
+
+    userIds = data.get('userIds')
+    if not isinstance(userIds, list) or not userIds:
+        return jsonify({'errors': [{'field': 'userIds', 'message': 'userIds must be a non-empty list'}]}), 422
+    if len(userIds) > current_app.config['MEMBERSHIP_BATCH_MAX']:
+        return jsonify({'errors': [{'field': 'userIds', 'message': 'At most %d userIds per request' % current_app.config['MEMBERSHIP_BATCH_MAX']}]}), 422
+
+    org = org_cache.get(orgId)
+    if not org or str(org.ownerId) != str(userId):
+        return jsonify({'status': 'Bad request', 'message': 'Organisation not found or access denied', 'statusCode': 404}), 404
+
+    parsed = [parse_uuid(value) for value in userIds]
+    valid = {value for value in parsed if value is not None}
+    existing = set(db.session.execute(db.select(User.userId).where(User.userId.in_(valid))).scalars()) if valid else set()
+    added = Organisation.add_members(org.orgId, existing)
+    User.bump_membership_version(added)
+    OutboxEvent.add('membership.added', ({'orgId': str(org.orgId), 'userId': str(user_uuid), 'addedBy': str(userId)}
+                                         for user_uuid in added))
+    db.session.commit()
+
+    results = []
+    for value, user_uuid in zip(userIds, parsed):
+        if user_uuid is None:
+            status = 'invalid'
+        elif user_uuid not in existing:
+            status = 'not_found'
+        elif user_uuid in added:
+            status = 'added'
+        else:
+            status = 'already_member'
+        results.append({'userId': str(value), 'status': status})
+    for user_uuid in added:
+        identity_cache.invalidate(user_uuid)
+        replica_router.stick(user_uuid)
+    if added:
+        audit_log.emit('membership.added', userId, orgId=orgId, memberIds=[str(user_uuid) for user_uuid in added])
+
+    return jsonify({'status': 'success', 'message': 'Users processed', 'data': {'added': len(added), 'results': results}}), 200
+
+
+@app.route('/organisations/<orgId>/users/export', methods=['GET'])
+@query_budget(2)
+@jwt_required()
+def export_organisation_users(orgId):
+    """Stream the members of an organisation as NDJSON, optionally only those who joined after ?since=."""
+    identity = identity_cache.get(get_jwt_identity())
+
+    if not identity:
+        return jsonify({'status': 'Bad request', 'message': 'User not found', 'statusCode': 404})
+
+    since = request.args.get('since')
+    if since:
+        try:
+            since = datetime.fromisoformat(since)
+        except ValueError:
+            return jsonify({'errors': [{'field': 'since', 'message': 'since must be an ISO 8601 timestamp'}]}), 422
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+
+    org_uuid = parse_uuid(orgId)
+    if not org_uuid or not Organisation.is_visible_to(org_uuid, identity.userId):
+        return jsonify({'status': 'Bad request', 'message': 'Organisation not found or access denied', 'statusCode': 404}), 404
+
+    stmt = (db.select(*user_columns(), user_organisation.c.createdAt)
+            .join(user_organisation, user_organisation.c.userId == User.userId)
+            .where(user_organisation.c.orgId == org_uuid)
+            .order_by(user_organisation.c.createdAt, user_organisation.c.userId))
+    if since:
+        stmt = stmt.where(user_organisation.c.createdAt > since)
+    # yield_per streams from a server-side cursor, so memory stays flat
+    stmt = stmt.execution_options(yield_per=current_app.config['EXPORT_YIELD_PER'])
+
+    def generate():
+        for row in db.session.execute(stmt):
+            member = user_to_dict(row)
+            member['joinedAt'] = row.createdAt.isoformat()
+            yield current_app.json.dumps(member) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/users/import', methods=['POST'])
+@query_budget(6)
+@jwt_required()
+def import_users_endpoint():
+    """Import a JSONL (default) or CSV (Content-Type: text/csv) body of at most BULK_IMPORT_MAX_ROWS users.
+
+    Every row costs a password hash on the shared pool, so only the users
+    listed in BULK_IMPORT_ALLOWED_USERS may call it.
+    """
+    identity = identity_cache.get(get_jwt_identity())
+    if not identity:
+        return jsonify({'status': 'Bad request', 'message': 'User not found', 'statusCode': 404})
+    allowed = {parse_uuid(userId) for userId in current_app.config['BULK_IMPORT_ALLOWED_USERS']}
+    if identity.userId not in allowed:
+        return jsonify({'status': 'Bad request', 'message': 'Bulk import is not allowed for this user', 'statusCode': 403}), 403
+
+    max_rows = current_app.config['BULK_IMPORT_MAX_ROWS']
+    fmt = 'csv' if request.mimetype == 'text/csv' else 'jsonl'
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    try:
+        records = list(islice(iter_records(stream, fmt), max_rows + 1))
+    except UnicodeDecodeError:
+        return jsonify({'status': 'Bad request', 'message': 'Body must be UTF-8 encoded', 'statusCode': 400}), 400
+    if len(records) > max_rows:
+        return jsonify({'status': 'Bad request', 'message': 'Import at most %d rows per request; use flask import-users for larger files' % max_rows, 'statusCode': 413}), 413
+    # One batch: the existence check and four inserts
+    report = import_users(records, max_rows)
+
+    return jsonify({'status': 'success', 'message': 'Import completed', 'data': report}), 200
+
+
+@app.route('/users/search', methods=['GET'])
+@query_budget(3)
+@jwt_required()
+@replica_reads
+def search_users():
+    """Find users by email, first name or last name.
+
+    Prefix and substring matches only cover users who already share an
+    organisation with the caller, like ``GET /api/users/<id>``. To find
+    someone new to add, look up their whole email with ``match=exact``.
+    """
+    identity = identity_cache.get(get_jwt_identity())
+    if not identity:
+        return jsonify({'status': 'Bad request', 'message': 'Current user not found', 'statusCode': 404})
+
+    config = current_app.config
+    errors = []
+    q = request.args.get('q', '').strip()
+    if len(q) < config['USER_SEARCH_MIN_LENGTH']:
+        errors.append({'field': 'q', 'message': 'Query must be at least %d characters' % config['USER_SEARCH_MIN_LENGTH']})
+    match = request.args.get('match', 'prefix')
+    if match not in ('prefix', 'contains', 'exact'):
+        errors.append({'field': 'match', 'message': 'Match must be prefix, contains or exact'})
+    elif match == 'contains' and len(q) < 3:
+        # Trigram indexes need at least three characters to narrow the scan
+        errors.append({'field': 'q', 'message': 'Substring queries must be at least 3 characters'})
+    limit = request.args.get('limit', config['USER_SEARCH_PAGE_SIZE'], type=int)
+    if limit is None or not 1 <= limit <= config['USER_SEARCH_PAGE_SIZE_MAX']:
+        errors.append({'field': 'limit', 'message': 'Limit must be between 1 and %d' % config['USER_SEARCH_PAGE_SIZE_MAX']})
+    cursor = request.args.get('cursor')
+    after = decode_cursor(cursor) if cursor else None
+    if cursor and after is None:
+        errors.append({'field': 'cursor', 'message': 'Invalid cursor'})
+    if errors:
+        return jsonify({'errors': errors}), 422
+
+    # Fetch one extra row to know whether another page exists
+    if match == 'exact':
+        rows = User.search(q, match, limit + 1, after)
+    elif match == 'prefix' and prefix_index.enabled:
+        allowed = set(db.session.execute(User.co_members(identity.userId)).scalars())
+        rows = prefix_index.search(q, limit + 1, after, allowed)
+    else:
+        rows = User.search(q, match, limit + 1, after, member_of=identity.userId)
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+
+    users = [{'userId': str(row.userId), 'firstName': row.firstName, 'lastName': row.lastName, 'email': row.email}
+             for row in rows[:limit]]
+    return jsonify({'status': 'success', 'message': 'Users retrieved', 'data': {'users': users, 'nextCursor': next_cursor}}), 200
+
+
 @app.route('/users/<id>', methods=['GET'])
+@query_budget(3)
 @jwt_required()
+@replica_reads
 def get_user(id):
     current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
+    current_user = identity_cache.get(current_user_id)
 
     if not current_user:
         return jsonify({'status': 'Bad request', 'message': 'Current user not found', 'statusCode': 404})
 
-    user = User.query.get(id)
+    user = identity_cache.get(id)
 
     if not user:
         return jsonify({'status': 'Bad request', 'message': 'User not found', 'statusCode': 404})
 
     # Check if the current user has access to this user's information
-    if str(user.userId) != current_user_id and not any(org in current_user.organisations for org in user.organisations):
+    if user.userId != current_user.userId and not User.shares_organisation(current_user.userId, user.userId):
         return jsonify({'status': 'Bad request', 'message': 'Access denied', 'statusCode': 403})
 
-    return jsonify({
+    # Access is checked above on every request; the body itself is just the snapshot
+    etag = make_etag(user.userId, user.firstName, user.lastName, user.email, user.phone)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    response = jsonify({
         'status': 'success',
         'message': 'User retrieved successfully',
-        'data': {
-            'userId': str(user.userId),
-            'firstName': user.firstName,
-            'lastName': user.lastName,
-            'email': user.email,
-            'phone': user.phone
-        }
-    }), 200
+        'data': user_to_dict(user)
+    })
+    return with_etag(response, etag), 200
+
+
+@app.route('/users/<id>/organisations', methods=['GET'])
+@query_budget(3)
+@jwt_required()
+@replica_reads
+def get_shared_organisations(id):
+    """List the organisations the current user shares with another user, keyset paginated."""
+    current_user = identity_cache.get(get_jwt_identity())
+
+    if not current_user:
+        return jsonify({'status': 'Bad request', 'message': 'Current user not found', 'statusCode': 404})
+
+    user = identity_cache.get(id)
+
+    if not user:
+        return jsonify({'status': 'Bad request', 'message': 'User not found', 'statusCode': 404})
+
+    limit, after, errors = page_args()
+    if errors:
+        return jsonify({'errors': errors}), 422
+
+    rows = Organisation.shared_between(current_user.userId, user.userId, limit + 1, after)
+    org_list, next_cursor = org_page(rows, limit)
+
+    return jsonify({'status': 'success', 'message': 'Shared organisations retrieved', 'data': {'organisations': org_list, 'nextCursor': next_cursor}}), 200
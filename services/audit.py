@@ -0,0 +1,156 @@
+from datetime import datetime, timezone
+import atexit
+import json
+import logging
+import queue
+import time
+from threading import Lock, Thread
+from flask import has_request_context, request
+from models import parse_uuid
+
+logger = logging.getLogger(__name__)
+
+
+class FileSink:
+    """Appends events to a file as JSON lines."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, events):
+        lines = ''.join(json.dumps({**event, 'createdAt': event['createdAt'].isoformat(),
+                                    'userId': event['userId'] and str(event['userId'])}) + '\n'
+                        for event in events)
+        with open(self.path, 'a') as handle:
+            handle.write(lines)
+
+
+class DatabaseSink:
+    """Inserts events into the audit_event table with one executemany per batch."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def write(self, events):
+        from app import db
+        from models.audit import AuditEvent
+
+        with self.app.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(db.insert(AuditEvent), events)
+
+
+class AuditLog:
+    """Structured audit trail written off the request path.
+
+    :meth:`emit` only builds a small dict and puts it on a bounded queue. A
+    background thread drains the queue in batches of AUDIT_BATCH_SIZE (or
+    whatever arrived within AUDIT_FLUSH_INTERVAL seconds) and hands each
+    batch to the sink: AUDIT_FILE for the ``file`` sink, the audit_event
+    table for ``database``. When the sink falls behind and the queue is full,
+    new events are dropped and counted rather than blocking requests.
+    """
+
+    def __init__(self, app=None):
+        self._lock = Lock()
+        self._generation = 0
+        self.enabled = False
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batch_size = 500
+        self._queue = queue.Queue()
+        atexit.register(self._flush_at_exit)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('AUDIT_ENABLED', True)
+        self.batch_size = app.config.get('AUDIT_BATCH_SIZE', 500)
+        self.flush_interval = app.config.get('AUDIT_FLUSH_INTERVAL', 1.0)
+        self.background = app.config.get('AUDIT_BACKGROUND', True)
+        if app.config.get('AUDIT_SINK', 'file') == 'database':
+            self.sink = DatabaseSink(app)
+        else:
+            self.sink = FileSink(app.config.get('AUDIT_FILE', 'audit.log'))
+        with self._lock:
+            self._generation += 1
+            self._started = False
+            self._queue = queue.Queue(maxsize=app.config.get('AUDIT_QUEUE_SIZE', 10000))
+        app.extensions['audit_log'] = self
+
+    def emit(self, event, userId=None, **data):
+        """Queue an audit event. Never blocks; drops the event if the queue is full."""
+        if not self.enabled:
+            return
+        if self.background and not self._started:
+            self._start()
+        try:
+            self._queue.put_nowait({
+                'event': event,
+                'userId': parse_uuid(userId) if userId else None,
+                'ip': request.remote_addr if has_request_context() else None,
+                'data': data or None,
+                'createdAt': datetime.now(timezone.utc),
+            })
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            Thread(target=self._run, args=(self._generation, self._queue), name='audit-flush', daemon=True).start()
+
+    def _run(self, generation, events):
+        while generation == self._generation:
+            try:
+                batch = [events.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            # Give the batch up to flush_interval to fill before writing it
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(events.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        try:
+            self.sink.write(batch)
+            self.written += len(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.exception('Failed to write %d audit events', len(batch))
+
+    def _flush_at_exit(self):
+        # The worker is a daemon thread; write whatever it left behind
+        if self.enabled and self.background:
+            self.flush()
+
+    def flush(self):
+        """Write everything queued so far from the calling thread."""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def stats(self):
+        return {'queued': self._queue.qsize(), 'written': self.written,
+                'dropped': self.dropped, 'failed': self.failed}
+
+
+audit_log = AuditLog()
@@ -0,0 +1,152 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from threading import BoundedSemaphore, Lock
+import time
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full and the request should be shed."""
+
+
+def expand_method(method):
+    """Fill in werkzeug's defaults, e.g. ``scrypt`` -> ``scrypt:32768:8:1``.
+
+    This is the method string a hash made with ``method`` starts with.
+    """
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = map(int, args) if args else (2 ** 15, 8, 1)
+        return f'scrypt:{n}:{r}:{p}'
+    if name == 'pbkdf2' and len(args) <= 2:
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1]) if len(args) == 2 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    raise ValueError(f'Invalid hash method {method!r}')
+
+
+class PasswordHasher:
+    """Runs password hashing on a bounded worker pool.
+
+    The key derivation functions used by werkzeug release the GIL, so a small
+    pool keeps hashing off the request threads without letting a login spike
+    take over every worker. Requests beyond the queue limit are rejected
+    instead of piling up.
+    """
+
+    def __init__(self, app=None):
+        self._executor = None
+        self._slots = None
+        self._lock = Lock()
+        self._pending = 0
+        self._count = 0
+        self._total_time = 0.0
+        self._max_time = 0.0
+        self._last_time = 0.0
+        self._listeners = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', 'scrypt')
+        self.salt_length = app.config.get('PASSWORD_HASH_SALT_LENGTH', 16)
+        self.wait_timeout = app.config.get('PASSWORD_HASH_QUEUE_TIMEOUT', 0.05)
+        workers = app.config.get('PASSWORD_HASH_WORKERS', 4)
+        queue_size = app.config.get('PASSWORD_HASH_QUEUE_SIZE', 4)
+        self.workers = workers
+        self.batch_window = app.config.get('PASSWORD_HASH_BATCH_WINDOW') or max(1, workers // 2)
+
+        # needs_rehash compares against the fully expanded method string
+        self.prefix = expand_method(self.method)
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        if app.config.get('PASSWORD_HASH_EXECUTOR', 'thread') == 'process':
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hasher')
+        self._slots = BoundedSemaphore(workers + queue_size)
+        app.extensions['password_hasher'] = self
+
+    def _submit(self, fn, *args, shed=True):
+        """Queue ``fn`` on the pool, holding one of the slots until it finishes.
+
+        With ``shed``, waits at most PASSWORD_HASH_QUEUE_TIMEOUT for a slot
+        and raises HashingBusy after that; otherwise blocks until one frees up.
+        """
+        if not self._slots.acquire(timeout=self.wait_timeout if shed else None):
+            raise HashingBusy()
+        with self._lock:
+            self._pending += 1
+        start = time.perf_counter()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._done(start)
+            raise
+        future.add_done_callback(lambda _: self._done(start))
+        return future
+
+    def _done(self, start):
+        elapsed = time.perf_counter() - start
+        self._slots.release()
+        with self._lock:
+            self._pending -= 1
+            self._count += 1
+            self._total_time += elapsed
+            self._last_time = elapsed
+            self._max_time = max(self._max_time, elapsed)
+        for listener in self._listeners:
+            listener(elapsed)
+
+    def hash(self, password):
+        return self._submit(generate_password_hash, password, self.method, self.salt_length).result()
+
+    def hash_many(self, passwords, window_size=None):
+        """Hash a batch of passwords on the pool, preserving order.
+
+        Used by bulk imports. At most ``window_size`` (by default
+        PASSWORD_HASH_BATCH_WINDOW) of the batch's hashes are queued at once
+        and each takes a slot like any other request, so interactive
+        hash/verify calls wait behind a few batch hashes rather than the
+        whole batch. Offline imports can pass a larger window.
+        """
+        window_size = window_size or self.batch_window
+        results, window = [], deque()
+        try:
+            for password in passwords:
+                if len(window) >= window_size:
+                    results.append(window.popleft().result())
+                # The batch waits for slots itself rather than being shed
+                window.append(self._submit(generate_password_hash, password, self.method, self.salt_length, shed=False))
+            while window:
+                results.append(window.popleft().result())
+        finally:
+            for future in window:
+                future.cancel()
+        return results
+
+    def verify(self, pwhash, password):
+        return self._submit(check_password_hash, pwhash, password).result()
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split('$', 1)[0] != self.prefix
+
+    def add_listener(self, fn):
+        """Register ``fn(seconds)`` to be called after every hash operation."""
+        if fn not in self._listeners:
+            self._listeners.append(fn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queueDepth': self._pending,
+                'hashes': self._count,
+                'totalSeconds': self._total_time,
+                'avgSeconds': self._total_time / self._count if self._count else 0.0,
+                'maxSeconds': self._max_time,
+                'lastSeconds': self._last_time,
+            }
+
+
+hasher = PasswordHasher()
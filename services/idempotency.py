@@ -0,0 +1,141 @@
+import hashlib
+from functools import wraps
+from threading import Event, Lock
+from flask import Response, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from services.cache import LRUCache
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+class Entry:
+    """One Idempotency-Key: the request fingerprint and, once finished, the response."""
+
+    __slots__ = ('fingerprint', 'response', 'done')
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.response = None
+        self.done = Event()
+
+
+class IdempotencyStore:
+    """Bounded, process-local store of Idempotency-Key results.
+
+    Finished responses are kept in an LRU for IDEMPOTENCY_TTL seconds
+    (at most IDEMPOTENCY_CACHE_SIZE of them). Requests still running are
+    tracked separately, so a duplicate that arrives in the meantime waits
+    for the first one instead of repeating its work. Keys are not shared
+    between worker processes.
+    """
+
+    def __init__(self, app=None):
+        self._lock = Lock()
+        self._inflight = {}
+        self._completed = LRUCache()
+        self.wait_timeout = 10
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        with self._lock:
+            self._inflight = {}
+            self._completed = LRUCache(maxsize=app.config.get('IDEMPOTENCY_CACHE_SIZE', 10000),
+                                       ttl=app.config.get('IDEMPOTENCY_TTL', 86400))
+        self.wait_timeout = app.config.get('IDEMPOTENCY_WAIT_TIMEOUT', 10)
+        app.extensions['idempotency'] = self
+
+    def begin(self, scope, fingerprint):
+        """Return (entry, owner). ``owner`` is True if the caller must run the request."""
+        with self._lock:
+            entry = self._completed.get(scope) or self._inflight.get(scope)
+            if entry is not None:
+                return entry, False
+            entry = self._inflight[scope] = Entry(fingerprint)
+            return entry, True
+
+    def complete(self, scope, entry, response):
+        with self._lock:
+            entry.response = response
+            self._completed.set(scope, entry)
+            self._inflight.pop(scope, None)
+        entry.done.set()
+
+    def abandon(self, scope, entry):
+        """Forget a request that failed, so the next retry runs it again."""
+        with self._lock:
+            self._inflight.pop(scope, None)
+        entry.done.set()
+
+    def stats(self):
+        return {'inflight': len(self._inflight), **self._completed.stats()}
+
+
+def request_fingerprint():
+    """Hash of the method, path and raw body that a key's retries must match."""
+    digest = hashlib.sha256()
+    digest.update(f'{request.method} {request.path}\n'.encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def _replay(response):
+    status, content_type, body = response
+    replayed = Response(body, status=status, content_type=content_type)
+    replayed.headers['Idempotent-Replayed'] = 'true'
+    return replayed
+
+
+def idempotent(view):
+    """Honour an Idempotency-Key header on a POST view.
+
+    The first request with a key runs normally and its response is stored.
+    Retries with the same key and body get the stored response back, and
+    concurrent duplicates wait for the first request to finish (409 after
+    IDEMPOTENCY_WAIT_TIMEOUT). Reusing a key with a different body is a 422.
+    5xx responses and exceptions are not stored. Keys are scoped per view
+    and per caller, so place it below ``@jwt_required()`` on authenticated
+    views.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'errors': [{'field': HEADER, 'message': 'Idempotency-Key must be at most %d characters' % MAX_KEY_LENGTH}]}), 422
+
+        try:
+            caller = get_jwt_identity()
+        except RuntimeError:  # unauthenticated view
+            caller = None
+        scope = (request.endpoint, caller, key)
+        fingerprint = request_fingerprint()
+
+        while True:
+            entry, owner = idempotency_store.begin(scope, fingerprint)
+            if entry.fingerprint != fingerprint:
+                return jsonify({'errors': [{'field': HEADER, 'message': 'Idempotency-Key was already used with a different request'}]}), 422
+            if owner:
+                break
+            if not entry.done.wait(idempotency_store.wait_timeout):
+                return jsonify({'status': 'Conflict', 'message': 'A request with this Idempotency-Key is still in progress', 'statusCode': 409}), 409
+            if entry.response is not None:
+                return _replay(entry.response)
+            # The first request failed; run it again
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except BaseException:
+            idempotency_store.abandon(scope, entry)
+            raise
+        if response.status_code >= 500 or response.is_streamed:
+            idempotency_store.abandon(scope, entry)
+        else:
+            idempotency_store.complete(scope, entry, (response.status_code, response.content_type, response.get_data()))
+        return response
+    return wrapper
+
+
+idempotency_store = IdempotencyStore()
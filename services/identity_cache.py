@@ -0,0 +1,76 @@
+from app import db
+from models import parse_uuid
+from models.user import User
+from services.cache import LRUCache
+from services.replica import replica_router
+
+
+class Identity:
+    """Immutable snapshot of the user columns needed by authenticated routes."""
+
+    __slots__ = ('userId', 'firstName', 'lastName', 'email', 'phone', 'membershipVersion')
+
+    def __init__(self, userId, firstName, lastName, email, phone, membershipVersion):
+        object.__setattr__(self, 'userId', userId)
+        object.__setattr__(self, 'firstName', firstName)
+        object.__setattr__(self, 'lastName', lastName)
+        object.__setattr__(self, 'email', email)
+        object.__setattr__(self, 'phone', phone)
+        object.__setattr__(self, 'membershipVersion', membershipVersion)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Identity is immutable')
+
+    def __repr__(self):
+        return f"<Identity {self.userId}>"
+
+
+class IdentityCache:
+    """Read-through cache of :class:`Identity` snapshots keyed by userId.
+
+    Only plain column values are cached, never ORM instances, so entries are
+    safe to share between requests and sessions. Missing users are not
+    cached, and entries loaded from a read replica expire with the sticky
+    window.
+    """
+
+    def __init__(self, app=None):
+        self._cache = LRUCache()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self._cache = LRUCache(maxsize=app.config.get('IDENTITY_CACHE_SIZE', 10000),
+                               ttl=app.config.get('IDENTITY_CACHE_TTL', 60))
+        app.extensions['identity_cache'] = self
+
+    def get(self, userId):
+        key = parse_uuid(userId)
+        if key is None:
+            return None
+
+        identity = self._cache.get(key)
+        if identity is not None:
+            return identity
+
+        row = db.session.execute(
+            db.select(User.userId, User.firstName, User.lastName, User.email, User.phone, User.membershipVersion)
+            .where(User.userId == key)
+        ).first()
+        if row is None:
+            return None
+        identity = Identity(*row)
+        self._cache.set(key, identity, replica_router.cache_ttl(self._cache.ttl))
+        return identity
+
+    def invalidate(self, userId):
+        self._cache.invalidate(parse_uuid(userId))
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+identity_cache = IdentityCache()
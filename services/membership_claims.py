@@ -0,0 +1,72 @@
+import base64
+import uuid
+from flask_jwt_extended import get_jwt
+from models.organisation import Organisation
+from services.cache import LRUCache
+
+
+def encode_org_ids(orgIds):
+    """Pack orgIds as base64url of their concatenated 16-byte values (22 chars per id instead of 36)."""
+    return base64.urlsafe_b64encode(b''.join(orgId.bytes for orgId in orgIds)).rstrip(b'=').decode()
+
+
+def decode_org_ids(value):
+    raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+    return frozenset(uuid.UUID(bytes=raw[i:i + 16]) for i in range(0, len(raw), 16))
+
+
+class MembershipClaims:
+    """Builds and reads the membership claims carried in access tokens.
+
+    An access token carries ``mv``, the user's membershipVersion when it
+    was issued. If the user can see at most JWT_MEMBERSHIP_CLAIM_MAX
+    organisations, it also carries ``orgs``, the packed ids of all of
+    them. Routes can then authorise from the token alone, as long as
+    ``mv`` still matches the version in the identity cache. Decoded sets
+    are cached per token id, so each token is decoded once per process.
+    """
+
+    def __init__(self, app=None):
+        self._decoded = LRUCache()
+        self.enabled = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('JWT_MEMBERSHIP_CLAIMS', True)
+        self.max_orgs = app.config.get('JWT_MEMBERSHIP_CLAIM_MAX', 200)
+        ttl = app.config['JWT_ACCESS_TOKEN_EXPIRES']
+        self._decoded = LRUCache(maxsize=app.config.get('JWT_MEMBERSHIP_CLAIM_CACHE_SIZE', 10000),
+                                 ttl=ttl.total_seconds() if hasattr(ttl, 'total_seconds') else ttl)
+        app.extensions['membership_claims'] = self
+
+    def build(self, userId, membershipVersion, orgIds=None):
+        """Return additional claims for an access token.
+
+        ``orgIds`` may be passed when the caller already knows them (e.g.
+        right after registration); otherwise they are loaded with one query.
+        """
+        if not self.enabled:
+            return {}
+        if orgIds is None:
+            orgIds = Organisation.visible_ids(userId, self.max_orgs + 1)
+        claims = {'mv': membershipVersion}
+        if len(orgIds) <= self.max_orgs:
+            claims['orgs'] = encode_org_ids(orgIds)
+        return claims
+
+    def org_ids(self, identity):
+        """Return the orgIds authorised by the current token, or None to fall back to the database."""
+        if not self.enabled:
+            return None
+        claims = get_jwt()
+        if 'orgs' not in claims or claims.get('mv') != identity.membershipVersion:
+            return None
+        orgIds = self._decoded.get(claims['jti'])
+        if orgIds is None:
+            orgIds = decode_org_ids(claims['orgs'])
+            self._decoded.set(claims['jti'], orgIds)
+        return orgIds
+
+
+membership_claims = MembershipClaims()
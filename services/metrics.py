@@ -0,0 +1,162 @@
+from bisect import bisect_left
+from threading import Lock
+import time
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Prometheus-style histogram keyed by a tuple of label values."""
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        for label_values, counts, total, count in series:
+            labels = ','.join(f'{name}="{value}"' for name, value in zip(self.labels, label_values))
+            prefix = labels + ',' if labels else ''
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            suffix = '{' + labels + '}' if labels else ''
+            lines.append(f'{self.name}_sum{suffix} {total}')
+            lines.append(f'{self.name}_count{suffix} {count}')
+        return lines
+
+
+def gauge(name, help, value, type='gauge'):
+    return [f'# HELP {name} {help}', f'# TYPE {name} {type}', f'{name} {value}']
+
+
+class Metrics:
+    """Request, database, pool and hashing metrics exposed in Prometheus text format."""
+
+    def __init__(self, app=None):
+        self.request_latency = Histogram('http_request_duration_seconds', 'Request latency by endpoint.',
+                                         ('endpoint', 'method', 'status'))
+        self.request_queries = Histogram('db_queries_per_request', 'SQL statements executed per request.',
+                                         ('endpoint',), COUNT_BUCKETS)
+        self.request_db_time = Histogram('db_time_per_request_seconds', 'Time spent in SQL statements per request.',
+                                         ('endpoint',))
+        self.pool_wait = Histogram('db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection.')
+        self.hash_time = Histogram('password_hash_duration_seconds', 'Time per password hash, including queueing.')
+        self._engines = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        from app import db
+        from services.hashing import hasher
+        from services.identity_cache import identity_cache
+        from services.org_cache import org_cache
+
+        self.hasher = hasher
+        self.identity_cache = identity_cache
+        self.org_cache = org_cache
+        hasher.add_listener(self.hash_time.observe)
+
+        self._engines = []
+        with app.app_context():
+            for engine in db.engines.values():
+                self._instrument_engine(engine)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule(app.config.get('METRICS_PATH', '/metrics'), 'metrics', self.expose)
+        app.extensions['metrics'] = self
+
+    def _instrument_engine(self, engine):
+        self._engines.append(engine)
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+        # The pool has no "checkout requested" event, so time connect() itself
+        pool = engine.pool
+        connect = pool.connect
+
+        def timed_connect():
+            start = time.perf_counter()
+            try:
+                return connect()
+            finally:
+                self.pool_wait.observe(time.perf_counter() - start)
+
+        pool.connect = timed_connect
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        if has_request_context() and 'db_queries' in g:
+            g.db_queries += 1
+            g.db_time += elapsed
+
+    @staticmethod
+    def _before_request():
+        g.request_start = time.perf_counter()
+        g.db_queries = 0
+        g.db_time = 0.0
+
+    def _after_request(self, response):
+        if 'request_start' in g:
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            self.request_latency.observe(time.perf_counter() - g.request_start,
+                                         endpoint, request.method, response.status_code)
+            self.request_queries.observe(g.db_queries, endpoint)
+            self.request_db_time.observe(g.db_time, endpoint)
+        return response
+
+    def expose(self):
+        lines = []
+        for histogram in (self.request_latency, self.request_queries, self.request_db_time,
+                          self.pool_wait, self.hash_time):
+            lines.extend(histogram.render())
+
+        hashing = self.hasher.stats()
+        lines.extend(gauge('password_hash_queue_depth', 'Hash operations queued or running.', hashing['queueDepth']))
+        cache = self.identity_cache.stats()
+        lines.extend(gauge('identity_cache_hits_total', 'Identity cache hits.', cache['hits'], 'counter'))
+        lines.extend(gauge('identity_cache_misses_total', 'Identity cache misses.', cache['misses'], 'counter'))
+        cache = self.org_cache.stats()
+        lines.extend(gauge('org_cache_hits_total', 'Organisation cache hits.', cache['hits'], 'counter'))
+        lines.extend(gauge('org_cache_misses_total', 'Organisation cache misses.', cache['misses'], 'counter'))
+        lines.extend(gauge('org_cache_hit_ratio', 'Organisation cache hit ratio.', cache['hitRatio']))
+
+        pools = [engine.pool for engine in self._engines]
+        lines.extend(gauge('db_pool_checked_out', 'Connections currently checked out.',
+                           sum(pool.checkedout() for pool in pools if hasattr(pool, 'checkedout'))))
+        lines.extend(gauge('db_pool_overflow', 'Connections opened beyond the pool size.',
+                           sum(pool.overflow() for pool in pools if hasattr(pool, 'overflow'))))
+
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+metrics = Metrics()
@@ -0,0 +1,178 @@
+import logging
+import select
+import time
+from threading import Lock, Thread
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from app import db
+from models import parse_uuid
+from models.organisation import Organisation
+from services.cache import LRUCache
+from services.replica import RoutingSession, replica_router
+
+logger = logging.getLogger(__name__)
+
+
+class OrgRecord:
+    """Immutable snapshot of an organisation's columns."""
+
+    __slots__ = ('orgId', 'name', 'description', 'ownerId', 'updatedAt')
+
+    def __init__(self, orgId, name, description, ownerId, updatedAt):
+        object.__setattr__(self, 'orgId', orgId)
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'description', description)
+        object.__setattr__(self, 'ownerId', ownerId)
+        object.__setattr__(self, 'updatedAt', updatedAt)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('OrgRecord is immutable')
+
+    def __repr__(self):
+        return f"<OrgRecord {self.orgId}>"
+
+
+class OrgCache:
+    """Read-through cache of :class:`OrgRecord` snapshots keyed by orgId.
+
+    Entries are invalidated after the transaction that changes them commits.
+    That covers :meth:`invalidate` calls and ORM updates or deletes of
+    Organisation rows. With ORG_CACHE_NOTIFY on PostgreSQL, each
+    invalidation is also sent as a NOTIFY on ORG_CACHE_CHANNEL. A listener
+    thread in every process drops the same entry; if its connection is
+    lost, it clears the whole cache, since notifications may have been
+    missed. Without it, other processes catch up after ORG_CACHE_TTL.
+    Missing organisations are not cached, and entries loaded from a read
+    replica expire with the sticky window.
+    """
+
+    def __init__(self, app=None):
+        self._cache = LRUCache()
+        self._lock = Lock()
+        self._generation = 0
+        self.notify = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self._cache = LRUCache(maxsize=app.config.get('ORG_CACHE_SIZE', 10000),
+                               ttl=app.config.get('ORG_CACHE_TTL', 300))
+        self.channel = app.config.get('ORG_CACHE_CHANNEL', 'org_cache')
+        uri = app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+        self.notify = app.config.get('ORG_CACHE_NOTIFY', False) and uri.startswith('postgres')
+        with self._lock:
+            self._generation += 1
+            self._listening = False
+        app.extensions['org_cache'] = self
+
+    def get(self, orgId):
+        key = parse_uuid(orgId)
+        if key is None:
+            return None
+        if self.notify and not self._listening:
+            self._listen()
+
+        record = self._cache.get(key)
+        if record is not None:
+            return record
+
+        row = db.session.execute(
+            db.select(Organisation.orgId, Organisation.name, Organisation.description,
+                      Organisation.ownerId, Organisation.updatedAt)
+            .where(Organisation.orgId == key)
+        ).first()
+        return self.put(row) if row is not None else None
+
+    def put(self, row):
+        """Cache a row (or anything with the same columns) already loaded by the caller."""
+        record = OrgRecord(row.orgId, row.name, row.description, row.ownerId, row.updatedAt)
+        self._cache.set(record.orgId, record, replica_router.cache_ttl(self._cache.ttl))
+        return record
+
+    def invalidate(self, orgId, session=None):
+        """Drop an entry once the session's transaction commits, or right away outside one."""
+        key = parse_uuid(orgId)
+        if key is None:
+            return
+        session = session or db.session()
+        if session.in_transaction():
+            session.info.setdefault('org_cache_invalidate', set()).add(key)
+        else:
+            self._invalidate([key])
+
+    def _invalidate(self, keys):
+        for key in keys:
+            self._cache.invalidate(key)
+        if self.notify:
+            try:
+                with db.engine.connect() as connection:
+                    for key in keys:
+                        connection.execute(db.text('SELECT pg_notify(:channel, :orgId)'),
+                                           {'channel': self.channel, 'orgId': str(key)})
+                    connection.commit()
+            except Exception:
+                logger.exception('Failed to publish organisation cache invalidation')
+
+    def _listen(self):
+        with self._lock:
+            if self._listening:
+                return
+            self._listening = True
+            Thread(target=self._run, args=(self._generation,), name='org-cache-listen', daemon=True).start()
+
+    def _run(self, generation):
+        while generation == self._generation:
+            try:
+                with self.app.app_context():
+                    connection = db.engine.raw_connection()
+                # Keep the LISTEN/autocommit connection out of the pool
+                connection.detach()
+                try:
+                    self._consume(connection, generation)
+                finally:
+                    connection.close()
+            except Exception:
+                logger.exception('Organisation cache listener failed; clearing cache')
+            # Notifications may have been missed while disconnected
+            self._cache.clear()
+            time.sleep(5)
+
+    def _consume(self, connection, generation):
+        driver = connection.driver_connection
+        driver.autocommit = True
+        with driver.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}"')
+        while generation == self._generation:
+            if select.select([driver], [], [], 5) == ([], [], []):
+                continue
+            driver.poll()
+            while driver.notifies:
+                self._cache.invalidate(parse_uuid(driver.notifies.pop(0).payload))
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+org_cache = OrgCache()
+
+
+@event.listens_for(Organisation, 'after_update')
+@event.listens_for(Organisation, 'after_delete')
+def _invalidate_on_change(mapper, connection, target):
+    org_cache.invalidate(target.orgId, object_session(target))
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _invalidate_after_commit(session):
+    keys = session.info.pop('org_cache_invalidate', None)
+    if keys:
+        org_cache._invalidate(keys)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('org_cache_invalidate', None)
@@ -0,0 +1,110 @@
+import json
+import logging
+import time
+import urllib.request
+from threading import Lock, Thread
+from app import db
+from models.outbox import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+
+class FileSink:
+    """Appends delivered events to a local file as JSON lines."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = Lock()
+
+    def send(self, events):
+        with self._lock, open(self.path, 'a') as handle:
+            handle.write(''.join(json.dumps(event) + '\n' for event in events))
+
+
+class HttpSink:
+    """POSTs each batch to a URL as ``{"events": [...]}``; any non-2xx response fails the batch."""
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, events):
+        body = json.dumps({'events': events}).encode()
+        request = urllib.request.Request(self.url, data=body, method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        # urlopen raises HTTPError for non-2xx responses
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+def make_sink(url, timeout=10):
+    """Build a sink from ``file:///path`` or an ``http(s)://`` URL."""
+    if url.startswith('file://'):
+        return FileSink(url[len('file://'):])
+    if url.startswith(('http://', 'https://')):
+        return HttpSink(url, timeout)
+    raise ValueError(f'Unsupported outbox sink: {url}')
+
+
+def relay_batch(sink, batch_size=1000):
+    """Deliver and delete up to ``batch_size`` outbox events. Returns the number delivered.
+
+    Rows are claimed with FOR UPDATE SKIP LOCKED, so concurrent relays take
+    disjoint batches instead of waiting on each other. The delete is only
+    committed after the sink accepted the batch: delivery is at least once,
+    and consumers should dedupe on the event id. With several relays,
+    events are not globally ordered.
+    """
+    try:
+        rows = db.session.execute(
+            db.select(OutboxEvent.id, OutboxEvent.topic, OutboxEvent.payload, OutboxEvent.createdAt)
+            .order_by(OutboxEvent.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if rows:
+            sink.send([{'id': id, 'topic': topic, 'payload': payload, 'createdAt': createdAt.isoformat()}
+                       for id, topic, payload, createdAt in rows])
+            db.session.execute(db.delete(OutboxEvent).where(OutboxEvent.id.in_([row.id for row in rows])))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(rows)
+
+
+def run_relay(app, sink, batch_size=1000, loop=False, poll_interval=1.0):
+    """Relay batches until the outbox is empty, or forever with ``loop``. Returns the number delivered."""
+    delivered = 0
+    with app.app_context():
+        while True:
+            try:
+                count = relay_batch(sink, batch_size)
+            except Exception:
+                logger.exception('Outbox relay batch failed')
+                if not loop:
+                    raise
+                count = 0
+            delivered += count
+            if count < batch_size:
+                if not loop:
+                    return delivered
+                time.sleep(poll_interval)
+
+
+def run_workers(app, sink, workers=1, **kwargs):
+    """Run ``workers`` relays in threads, each with its own session. Returns the total delivered."""
+    if workers == 1:
+        return run_relay(app, sink, **kwargs)
+
+    results = [0] * workers
+
+    def work(index):
+        results[index] = run_relay(app, sink, **kwargs)
+
+    threads = [Thread(target=work, args=(index,), name=f'outbox-relay-{index}') for index in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(results)
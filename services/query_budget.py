@@ -0,0 +1,137 @@
+from collections import Counter
+from contextlib import contextmanager
+import logging
+import os
+import traceback
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in testing mode when a view runs more statements than its budget."""
+
+
+def query_budget(max_statements):
+    """Declare the maximum number of SQL statements a view may execute.
+
+    Place it directly below ``@app.route`` so the attribute lands on the
+    function Flask registers.
+    """
+    def decorator(view):
+        view.query_budget = max_statements
+        return view
+    return decorator
+
+
+@contextmanager
+def unbudgeted():
+    """Leave statements run inside the block out of the current view's budget.
+
+    For one-off work that does not belong to the view, such as lookups made
+    while a process is still warming up.
+    """
+    if not has_request_context():
+        yield
+        return
+    previous = g.get('unbudgeted', False)
+    g.unbudgeted = True
+    try:
+        yield
+    finally:
+        g.unbudgeted = previous
+
+
+@contextmanager
+def count_queries(engine):
+    """Collect the SQL statements executed on ``engine`` inside the block."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+class QueryBudget:
+    """Enforces per-view statement budgets and reports likely N+1 patterns.
+
+    Budgets are checked when ``QUERY_BUDGET_ENABLED`` is set (testing and
+    debug by default). In testing mode an exceeded budget raises, so the
+    test making the request fails; otherwise it is logged. With
+    ``QUERY_DEBUG`` on, identical statements repeated within one request are
+    logged as N+1 suspects together with the application frame issuing them.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('QUERY_BUDGET_ENABLED')
+        if self.enabled is None:
+            self.enabled = app.testing or app.debug
+        self.debug = app.config.get('QUERY_DEBUG')
+        if self.debug is None:
+            self.debug = app.debug
+        self.repeat_threshold = app.config.get('QUERY_DEBUG_REPEAT_THRESHOLD', 3)
+        if not self.enabled and not self.debug:
+            return
+
+        from app import db
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self._record)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.extensions['query_budget'] = self
+
+    @staticmethod
+    def _before_request():
+        g.query_log = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if not has_request_context() or 'query_log' not in g or g.get('unbudgeted'):
+            return
+        g.query_log.append((statement, self._call_site() if self.debug else None))
+
+    @staticmethod
+    def _call_site():
+        root = current_app.root_path
+        here = os.path.abspath(__file__)
+        for frame in reversed(traceback.extract_stack()):
+            filename = os.path.abspath(frame.filename)
+            if filename.startswith(root) and filename != here and 'site-packages' not in filename:
+                return f'{frame.filename}:{frame.lineno} in {frame.name}'
+        return 'unknown'
+
+    def _after_request(self, response):
+        log = g.pop('query_log', None)
+        if log is None:
+            return response
+
+        if self.debug:
+            repeats = Counter(statement for statement, _ in log)
+            for statement, count in repeats.items():
+                if count >= self.repeat_threshold:
+                    site = next(site for text, site in log if text == statement)
+                    logger.warning('Possible N+1 in %s: %d identical statements issued from %s: %s',
+                                   request.endpoint, count, site, statement)
+
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', None)
+        if self.enabled and budget is not None and len(log) > budget:
+            message = '%s executed %d SQL statements, budget is %d' % (request.endpoint, len(log), budget)
+            if current_app.testing:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+query_budget_checker = QueryBudget()
@@ -0,0 +1,141 @@
+import itertools
+from functools import wraps
+from flask import current_app
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from services.cache import LRUCache
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+
+class RoutingSession(Session):
+    """Session that can send SELECTs to a read replica.
+
+    Replica reads only happen inside views decorated with
+    :func:`replica_reads`, and only until the session writes: the first
+    flush or INSERT/UPDATE/DELETE pins it to the primary, so reads after a
+    write in the same request see that write. Everything else (writes,
+    flushes, raw SQL, ``get_bind()`` without a statement) uses the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause):
+            if 'replica_engine' not in self.info:
+                self.info['replica_engine'] = replica_router.choose(self._db.engines)
+            if self.info['replica_engine'] is not None:
+                return self.info['replica_engine']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self, clause):
+        return (self.info.get('replica_reads') and not self.info.get('pinned') and not self._flushing
+                and getattr(clause, 'is_select', False))
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _pin_on_write(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info['pinned'] = True
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _pin_after_flush(session, flush_context):
+    session.info['pinned'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _stick_after_commit(session):
+    if session.info.get('pinned'):
+        replica_router.stick(_current_identity())
+
+
+def _current_identity():
+    try:
+        return get_jwt_identity()
+    except RuntimeError:  # not inside a @jwt_required view
+        return None
+
+
+class ReplicaRouter:
+    """Picks read replicas and remembers which users recently wrote.
+
+    Replica URLs come from ``DATABASE_REPLICA_URLS`` and become
+    ``replica_<n>`` entries in ``SQLALCHEMY_BINDS``, so ``init_app`` must run
+    before ``db.init_app``. Sessions pick replicas round-robin. After a user
+    commits a write, their reads go to the primary for
+    ``DATABASE_REPLICA_STICKY_SECONDS`` to hide replication lag. Users
+    whose data someone else changed (e.g. new members of an organisation)
+    are made sticky the same way. That window is kept per process.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self._sticky = LRUCache(maxsize=1)
+        self._cycle = itertools.count()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        urls = app.config.get('DATABASE_REPLICA_URLS') or []
+        self.binds = [f'{REPLICA_BIND_PREFIX}{index}' for index in range(len(urls))]
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds.update(zip(self.binds, urls))
+        app.config['SQLALCHEMY_BINDS'] = binds
+        self.enabled = bool(self.binds)
+        self.sticky_seconds = app.config.get('DATABASE_REPLICA_STICKY_SECONDS', 0)
+        self._sticky = LRUCache(maxsize=app.config.get('DATABASE_REPLICA_STICKY_SIZE', 10000),
+                                ttl=self.sticky_seconds)
+        app.extensions['replica_router'] = self
+
+    def choose(self, engines):
+        """Return the next replica engine, or None if there are none."""
+        if not self.binds:
+            return None
+        return engines[self.binds[next(self._cycle) % len(self.binds)]]
+
+    def stick(self, userId):
+        """Route ``userId``'s reads to the primary for the sticky window."""
+        if self.enabled and self.sticky_seconds and userId is not None:
+            self._sticky.set(str(userId), True)
+
+    def is_sticky(self, userId):
+        return userId is not None and self._sticky.get(str(userId)) is not None
+
+    def cache_ttl(self, ttl):
+        """TTL for a cache entry loaded through the current request's session.
+
+        Rows read from a replica may lag the primary, so while the session
+        reads from one the TTL is capped at the sticky window; a process-wide
+        cache must not keep them longer than routing hides the lag.
+        """
+        if not self.enabled:
+            return ttl
+        info = current_app.extensions['sqlalchemy'].session.info
+        if info.get('replica_reads') and not info.get('pinned'):
+            return min(ttl, self.sticky_seconds)
+        return ttl
+
+
+def replica_reads(view):
+    """Let a read-only view's SELECTs go to a replica.
+
+    Place it directly above the view function, below ``@jwt_required()``,
+    so the caller's identity is known when checking stickiness.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not replica_router.enabled or replica_router.is_sticky(_current_identity()):
+            return view(*args, **kwargs)
+
+        info = current_app.extensions['sqlalchemy'].session.info
+        info['replica_reads'] = True
+        info.pop('pinned', None)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            for key in ('replica_reads', 'replica_engine', 'pinned'):
+                info.pop(key, None)
+    return wrapper
+
+
+replica_router = ReplicaRouter()
@@ -0,0 +1,237 @@
+from datetime import datetime, timedelta, timezone
+import hashlib
+import logging
+from threading import Event, Lock, Thread
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings using double hashing of a blake2b digest."""
+
+    def __init__(self, bits=1 << 20, hashes=7):
+        self.bits = bits
+        self.hashes = hashes
+        self._array = bytearray((bits + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.bits for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self._array[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationList:
+    """In-process view of revoked token ids, kept in sync with the revoked_token table.
+
+    Only explicitly revoked tokens (logout) are listed; rotated refresh
+    tokens go to used_refresh_token instead, see :meth:`use_refresh_token`.
+    Once loaded, lookups never touch the database: a Bloom filter answers
+    the common "not revoked" case and an exact set confirms the rest. Until
+    the first load finishes, each check is a primary key lookup instead, so
+    a cold start does not wait for it (unless REVOCATION_STARTUP_WAIT is
+    set). A background thread pulls newly
+    revoked ids every REVOCATION_SYNC_INTERVAL seconds and rebuilds both
+    structures every REVOCATION_REBUILD_INTERVAL seconds to drop expired
+    tokens, deleting their rows and expired used refresh tokens.
+    Revocations made by this process apply immediately; revocations made
+    by other workers apply after the next sync.
+    """
+
+    # Re-read a few seconds before the watermark so rows committed late
+    # with an earlier revokedAt are not missed
+    SYNC_OVERLAP = timedelta(seconds=5)
+
+    def __init__(self, app=None):
+        self._lock = Lock()
+        self._generation = 0
+        self._started = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app import jwt
+
+        self.app = app
+        self.sync_interval = app.config.get('REVOCATION_SYNC_INTERVAL', 30)
+        self.rebuild_interval = app.config.get('REVOCATION_REBUILD_INTERVAL', 3600)
+        self.startup_wait = app.config.get('REVOCATION_STARTUP_WAIT', 0)
+        self.bloom_bits = app.config.get('REVOCATION_BLOOM_BITS', 1 << 20)
+        self.bloom_hashes = app.config.get('REVOCATION_BLOOM_HASHES', 7)
+        with self._lock:
+            self._generation += 1
+            self._started = False
+            self._ready = Event()
+            self._reset()
+
+        jwt.token_in_blocklist_loader(self._check_token)
+        app.extensions['revocation_list'] = self
+
+    def _reset(self):
+        self._bloom = BloomFilter(self.bloom_bits, self.bloom_hashes)
+        self._revoked = set()
+        self._pending = None
+        self._watermark = None
+        self._rebuilt_at = time.monotonic()
+
+    def _check_token(self, jwt_header, jwt_payload):
+        return self.is_revoked(jwt_payload['jti'])
+
+    def is_revoked(self, jti):
+        if not self._started:
+            self._start()
+        if not self._ready.is_set():
+            return self._lookup(jti)
+        if jti not in self._bloom:
+            return False
+        return jti in self._revoked
+
+    @staticmethod
+    def _lookup(jti):
+        from app import db
+        from models.token import RevokedToken
+        from services.query_budget import unbudgeted
+
+        # Only until the first sync finishes, so not part of any view's budget
+        with unbudgeted():
+            return db.session.execute(db.select(db.select(RevokedToken.jti).where(RevokedToken.jti == jti).exists())).scalar()
+
+    def revoke(self, jwt_payload):
+        """Record a decoded token as revoked. The caller commits."""
+        from app import db
+        from models import parse_uuid
+        from models.token import RevokedToken
+
+        jti = jwt_payload['jti']
+        db.session.add(RevokedToken(
+            jti=jti,
+            tokenType=jwt_payload['type'],
+            userId=parse_uuid(jwt_payload['sub']),
+            expiresAt=datetime.fromtimestamp(jwt_payload['exp'], timezone.utc)
+        ))
+        with self._lock:
+            self._bloom.add(jti)
+            self._revoked.add(jti)
+            if self._pending is not None:
+                self._pending.add(jti)
+
+    @staticmethod
+    def use_refresh_token(jwt_payload):
+        """Record a refresh token as exchanged. The caller commits.
+
+        Raises IntegrityError on commit if the token was already used,
+        which is how a replayed refresh token is detected. These rows are
+        not loaded into memory: no other check needs them.
+        """
+        from app import db
+        from models import parse_uuid
+        from models.token import UsedRefreshToken
+
+        db.session.add(UsedRefreshToken(
+            jti=jwt_payload['jti'],
+            userId=parse_uuid(jwt_payload['sub']),
+            expiresAt=datetime.fromtimestamp(jwt_payload['exp'], timezone.utc)
+        ))
+
+    def _start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            ready = self._ready
+            Thread(target=self._run, args=(self._generation, ready), name='revocation-sync', daemon=True).start()
+        if self.startup_wait:
+            ready.wait(timeout=self.startup_wait)
+
+    def _run(self, generation, ready):
+        while generation == self._generation:
+            try:
+                with self.app.app_context():
+                    self.sync()
+                ready.set()
+            except Exception:
+                logger.exception('Revocation list sync failed')
+            time.sleep(self.sync_interval)
+
+    def sync(self):
+        """Pull revocations newer than the last sync into the local structures.
+
+        Every REVOCATION_REBUILD_INTERVAL it instead deletes expired rows and
+        reloads the rest into fresh structures, which replace the current
+        ones only once they are complete.
+        """
+        from app import db
+        from models.token import RevokedToken
+
+        now = datetime.now(timezone.utc)
+        rebuild = time.monotonic() - self._rebuilt_at > self.rebuild_interval
+        if rebuild:
+            with self._lock:
+                # Local revocations made while the rebuild runs; see revoke()
+                self._pending = set()
+
+        stmt = (db.select(RevokedToken.jti, RevokedToken.revokedAt)
+                .where(RevokedToken.expiresAt > now))
+        if self._watermark is not None and not rebuild:
+            stmt = stmt.where(RevokedToken.revokedAt > self._watermark - self.SYNC_OVERLAP)
+        try:
+            if rebuild:
+                self._prune(now)
+            rows = db.session.execute(stmt).all()
+        finally:
+            db.session.remove()
+
+        if not rebuild:
+            with self._lock:
+                self._watermark = self._add(self._bloom, self._revoked, rows, self._watermark)
+            return
+
+        bloom = BloomFilter(self.bloom_bits, self.bloom_hashes)
+        revoked = set()
+        watermark = self._add(bloom, revoked, rows)
+        with self._lock:
+            for jti in self._pending:
+                bloom.add(jti)
+                revoked.add(jti)
+            self._pending = None
+            self._bloom, self._revoked = bloom, revoked
+            self._watermark = watermark
+            self._rebuilt_at = time.monotonic()
+
+    @staticmethod
+    def _add(bloom, revoked, rows, watermark=None):
+        """Add ``(jti, revokedAt)`` rows and return the newest revokedAt seen."""
+        for jti, revokedAt in rows:
+            bloom.add(jti)
+            revoked.add(jti)
+            if watermark is None or revokedAt > watermark:
+                watermark = revokedAt
+        return watermark
+
+    @staticmethod
+    def _prune(now):
+        """Delete revoked and used refresh token rows whose tokens have expired anyway."""
+        from app import db
+        from models.token import RevokedToken, UsedRefreshToken
+
+        try:
+            db.session.execute(db.delete(RevokedToken).where(RevokedToken.expiresAt <= now))
+            db.session.execute(db.delete(UsedRefreshToken).where(UsedRefreshToken.expiresAt <= now))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception('Failed to prune expired revoked tokens')
+
+    def stats(self):
+        return {'revoked': len(self._revoked), 'watermark': self._watermark}
+
+
+revocation_list = RevocationList()
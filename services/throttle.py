@@ -0,0 +1,128 @@
+from collections import OrderedDict
+from threading import Lock
+import sqlite3
+import time
+
+
+class MemoryBackend:
+    """Token buckets held in this process, evicting the least recently used key."""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = Lock()
+
+    def take(self, key, rate, burst, now):
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return allowed
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBackend:
+    """Token buckets in a local SQLite file so several workers share counters.
+
+    This stands in for a shared store such as Redis on single-host
+    deployments. Rows untouched for longest are pruned past ``max_keys``.
+    """
+
+    def __init__(self, path, max_keys=10000):
+        self.path = path
+        self.max_keys = max_keys
+        conn = self._connect()
+        try:
+            conn.execute('CREATE TABLE IF NOT EXISTS bucket '
+                         '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_bucket_updated ON bucket (updated)')
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=1, isolation_level=None)
+
+    def take(self, key, rate, burst, now):
+        conn = self._connect()
+        try:
+            # Take the write lock before reading so concurrent workers
+            # cannot both spend the same token.
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT tokens, updated FROM bucket WHERE key = ?', (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute('INSERT OR REPLACE INTO bucket (key, tokens, updated) VALUES (?, ?, ?)',
+                         (key, tokens, now))
+            if row is None:
+                conn.execute('DELETE FROM bucket WHERE key IN (SELECT key FROM bucket '
+                             'ORDER BY updated DESC LIMIT -1 OFFSET ?)', (self.max_keys,))
+            conn.execute('COMMIT')
+            return allowed
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def reset(self):
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM bucket')
+        finally:
+            conn.close()
+
+
+class LoginThrottle:
+    """Token bucket limiter applied to login attempts per email and per client IP."""
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('LOGIN_THROTTLE_ENABLED', True)
+        self.rate = app.config.get('LOGIN_THROTTLE_RATE', 0.1)
+        self.burst = app.config.get('LOGIN_THROTTLE_BURST', 5)
+        self.ip_rate = app.config.get('LOGIN_THROTTLE_IP_RATE', 1.0)
+        self.ip_burst = app.config.get('LOGIN_THROTTLE_IP_BURST', 30)
+        max_keys = app.config.get('LOGIN_THROTTLE_MAX_KEYS', 10000)
+        backend = app.config.get('LOGIN_THROTTLE_BACKEND', 'memory')
+
+        if backend.startswith('sqlite:///'):
+            self.backend = SQLiteBackend(backend[len('sqlite:///'):], max_keys)
+        else:
+            self.backend = MemoryBackend(max_keys)
+        app.extensions['login_throttle'] = self
+
+    def allow(self, email, ip):
+        """Take a token from both the email and the IP bucket.
+
+        Both buckets are always charged so that an attacker rotating emails
+        from one address is still limited by the IP bucket.
+        """
+        if not self.enabled:
+            return True
+        now = time.time()
+        email_ok = self.backend.take('email:' + (email or '').strip().lower(), self.rate, self.burst, now)
+        ip_ok = self.backend.take('ip:' + (ip or ''), self.ip_rate, self.ip_burst, now)
+        return email_ok and ip_ok
+
+    def reset(self):
+        self.backend.reset()
+
+
+throttle = LoginThrottle()
@@ -0,0 +1,115 @@
+import base64
+import bisect
+import threading
+import time
+from collections import namedtuple
+from app import db
+from models import parse_uuid
+from models.user import User
+
+SearchRow = namedtuple('SearchRow', 'userId firstName lastName email emailKey')
+
+
+def encode_cursor(row):
+    """Opaque keyset cursor for the (lower(email), userId) ordering."""
+    raw = f'{row.emailKey}\n{row.userId}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the (emailKey, userId) tuple for a cursor, or None if it is invalid."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        email_key, userId = raw.split('\n')
+    except ValueError:
+        return None
+    userId = parse_uuid(userId)
+    return (email_key, userId) if userId is not None else None
+
+
+class PrefixIndex:
+    """In-memory prefix index over lower-cased email, firstName and lastName.
+
+    Meant for small deployments: the whole user table is loaded into three
+    sorted lists and prefix matches are bisected, so searches never touch the
+    database. The snapshot is rebuilt lazily every ``ttl`` seconds; new
+    registrations in this process are inserted straight away, other
+    processes see them after the next rebuild. Substring search is not
+    served from here.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.ttl = 300
+        self._lock = threading.Lock()
+        self._keys = None
+        self._loaded_at = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('USER_SEARCH_MEMORY_INDEX', False)
+        self.ttl = app.config.get('USER_SEARCH_MEMORY_TTL', 300)
+        self.clear()
+        app.extensions['user_search'] = self
+
+    def _load(self):
+        keys = ([], [], [])
+        for userId, firstName, lastName, email in db.session.execute(
+                db.select(User.userId, User.firstName, User.lastName, User.email)):
+            self._insert(keys, SearchRow(userId, firstName, lastName, email, email.lower()))
+        for entries in keys:
+            entries.sort(key=lambda entry: entry[:2])
+        return keys
+
+    @staticmethod
+    def _insert(keys, row, sort=False):
+        fields = (row.emailKey, row.firstName.lower(), row.lastName.lower())
+        for entries, key in zip(keys, fields):
+            entry = (key, str(row.userId), row)
+            if sort:
+                bisect.insort(entries, entry, key=lambda item: item[:2])
+            else:
+                entries.append(entry)
+
+    def _snapshot(self):
+        with self._lock:
+            if self._keys is None or time.monotonic() - self._loaded_at > self.ttl:
+                self._keys = self._load()
+                self._loaded_at = time.monotonic()
+            return self._keys
+
+    def search(self, q, limit=20, after=None, allowed=None):
+        """Return up to ``limit`` prefix matches ordered like :meth:`User.search`.
+
+        ``allowed`` optionally restricts the matches to a set of userIds.
+        """
+        prefix = q.lower()
+        matches = {}
+        for entries in self._snapshot():
+            start = bisect.bisect_left(entries, (prefix,), key=lambda item: item[:1])
+            for key, _, row in entries[start:]:
+                if not key.startswith(prefix):
+                    break
+                if allowed is None or row.userId in allowed:
+                    matches[row.userId] = row
+
+        rows = sorted(matches.values(), key=lambda row: (row.emailKey, str(row.userId)))
+        if after is not None:
+            after = (after[0], str(after[1]))
+            rows = [row for row in rows if (row.emailKey, str(row.userId)) > after]
+        return rows[:limit]
+
+    def add(self, userId, firstName, lastName, email):
+        """Insert a newly registered user if a snapshot is loaded."""
+        with self._lock:
+            if self._keys is not None:
+                self._insert(self._keys, SearchRow(userId, firstName, lastName, email, email.lower()), sort=True)
+
+    def clear(self):
+        with self._lock:
+            self._keys = None
+            self._loaded_at = 0.0
+
+
+prefix_index = PrefixIndex()
@@ -1,12 +1,23 @@
 import unittest
 import json
+import os
+import time
 import logging
 from app import create_app, db
+from flask import request
 from flask_jwt_extended import decode_token
 from datetime import datetime, timedelta
 from models.user import User
 from models.organisation import Organisation
+from models.audit import AuditEvent
+from services.audit import audit_log
+from services.hashing import hasher
+from services.revocation import revocation_list
+from models.token import RevokedToken, UsedRefreshToken
+from sqlalchemy import event
+from services.idempotency import idempotency_store, request_fingerprint
 from pytz import timezone as pytz_timezone
+from werkzeug.security import generate_password_hash, check_password_hash
 
 class AuthTestCase(unittest.TestCase):
 
@@ -50,6 +61,37 @@ class AuthTestCase(unittest.TestCase):
         org = Organisation.query.filter_by(ownerId=user.userId).first()
         self.assertEqual(org.name, "John's Organisation")
 
+        # Keys are time-ordered UUIDv7s
+        self.assertEqual(user.userId.version, 7)
+        self.assertLess(user.userId, org.orgId)
+
+    def test_register_idempotency_key_replays_response(self):
+        """Test that a retried registration with the same Idempotency-Key replays the first response"""
+        payload = {'firstName': 'John', 'lastName': 'Doe', 'email': 'john@example.com', 'password': 'password123'}
+        headers = {'Idempotency-Key': 'retry-1'}
+        first = self.client.post('/auth/register', json=payload, headers=headers)
+        retry = self.client.post('/auth/register', json=payload, headers=headers)
+
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(User.query.count(), 1)
+
+        response = self.client.post('/auth/register', json={**payload, 'email': 'jane@example.com'}, headers=headers)
+        self.assertEqual(response.status_code, 422)
+
+    def test_register_idempotency_key_in_flight(self):
+        """Test that a duplicate of a request still in progress waits, then gets a 409"""
+        payload = {'firstName': 'John', 'lastName': 'Doe', 'email': 'john@example.com', 'password': 'password123'}
+        with self.app.test_request_context('/auth/register', method='POST', json=payload):
+            fingerprint = request_fingerprint()
+        idempotency_store.wait_timeout = 0.05
+        idempotency_store.begin(('auth.register', None, 'retry-2'), fingerprint)
+
+        response = self.client.post('/auth/register', json=payload, headers={'Idempotency-Key': 'retry-2'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(User.query.count(), 0)
+
     def test_login_success(self):
         """Test successful user login"""
         self.client.post('/auth/register', json={
@@ -73,6 +115,145 @@ class AuthTestCase(unittest.TestCase):
         self.assertIn('user', data['data'])
         self.assertEqual(data['data']['user']['email'], 'jane@example.com')
 
+    def test_login_rehashes_outdated_password(self):
+        """Test that login upgrades a hash made with old cost parameters"""
+        self.client.post('/auth/register', json={
+            'firstName': 'Jane',
+            'lastName': 'Doe',
+            'email': 'jane@example.com',
+            'password': 'password123'
+        })
+        user = User.query.filter_by(email='jane@example.com').first()
+        user.password = generate_password_hash('password123', 'pbkdf2:sha256:1')
+        db.session.commit()
+
+        response = self.client.post('/auth/login', json={
+            'email': 'jane@example.com',
+            'password': 'password123'
+        })
+        self.assertEqual(response.status_code, 200)
+
+        user = User.query.filter_by(email='jane@example.com').first()
+        self.assertTrue(user.password.startswith('pbkdf2:sha256:1000$'))
+        self.assertTrue(check_password_hash(user.password, 'password123'))
+
+    def test_hash_many_keeps_slots_for_interactive_requests(self):
+        """Test that a bulk hash queues at most PASSWORD_HASH_BATCH_WINDOW hashes at a time"""
+        depths = []
+        hasher.batch_window = 2
+        hasher.add_listener(lambda seconds: depths.append(hasher.stats()['queueDepth']))
+        try:
+            hashes = hasher.hash_many(['a', 'b', 'c', 'd', 'e'])
+        finally:
+            hasher._listeners.pop()
+        self.assertEqual([check_password_hash(pwhash, password) for pwhash, password in zip(hashes, 'abcde')], [True] * 5)
+        self.assertEqual(len(depths), 5)
+        self.assertLessEqual(max(depths), 2)
+        self.assertEqual(hasher.stats()['queueDepth'], 0)
+
+    def test_login_shed_when_hashing_pool_is_full(self):
+        """Test that a login is answered with 503 right away when every hashing slot is taken"""
+        self.client.post('/auth/register', json={
+            'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane@example.com', 'password': 'password123'})
+        slots = self.app.config['PASSWORD_HASH_WORKERS'] + self.app.config['PASSWORD_HASH_QUEUE_SIZE']
+        for _ in range(slots):
+            hasher._slots.acquire()
+        try:
+            start = time.perf_counter()
+            response = self.client.post('/auth/login', json={'email': 'jane@example.com', 'password': 'password123'})
+            elapsed = time.perf_counter() - start
+        finally:
+            for _ in range(slots):
+                hasher._slots.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertLess(elapsed, 1)
+
+    def test_refresh_token_rotation(self):
+        """Test that a refresh token yields new tokens once and is revoked afterwards"""
+        response = self.client.post('/auth/register', json={
+            'firstName': 'Jane',
+            'lastName': 'Doe',
+            'email': 'jane@example.com',
+            'password': 'password123'
+        })
+        refresh_token = json.loads(response.data)['data']['refreshToken']
+
+        response = self.client.post('/auth/refresh', headers={'Authorization': f'Bearer {refresh_token}'})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)['data']
+        self.assertIn('accessToken', data)
+        self.assertNotEqual(data['refreshToken'], refresh_token)
+
+        response = self.client.post('/auth/refresh', headers={'Authorization': f'Bearer {refresh_token}'})
+        self.assertEqual(response.status_code, 401)
+
+        # Rotation is tracked apart from the in-memory revocation list
+        jti = decode_token(refresh_token)['jti']
+        self.assertEqual([token.jti for token in UsedRefreshToken.query], [jti])
+        self.assertEqual(RevokedToken.query.count(), 0)
+        self.assertEqual(revocation_list.stats()['revoked'], 0)
+
+    def test_revocation_check_before_first_sync(self):
+        """Test that checks made before the list is loaded look the token up instead of waiting"""
+        response = self.client.post('/auth/register', json={
+            'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane@example.com', 'password': 'password123'})
+        token = json.loads(response.data)['data']['accessToken']
+        db.session.add(RevokedToken(jti=decode_token(token)['jti'], tokenType='access', userId=User.query.one().userId,
+                                    expiresAt=datetime.now(pytz_timezone('UTC')) + timedelta(minutes=15)))
+        db.session.commit()
+
+        revocation_list._started = True
+        revocation_list._ready.clear()
+        self.assertTrue(revocation_list.is_revoked(decode_token(token)['jti']))
+        self.assertFalse(revocation_list.is_revoked('not-revoked'))
+        response = self.client.get('/api/organisations', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_revokes_access_token(self):
+        """Test that an access token is rejected after logout"""
+        response = self.client.post('/auth/register', json={
+            'firstName': 'Jane',
+            'lastName': 'Doe',
+            'email': 'jane@example.com',
+            'password': 'password123'
+        })
+        headers = {'Authorization': f"Bearer {json.loads(response.data)['data']['accessToken']}"}
+
+        self.assertEqual(self.client.get('/api/organisations', headers=headers).status_code, 200)
+        self.assertEqual(self.client.post('/auth/logout', headers=headers).status_code, 200)
+        self.assertEqual(self.client.get('/api/organisations', headers=headers).status_code, 401)
+
+    def test_revocation_rebuild_keeps_revoked_tokens(self):
+        """Test that a rebuild swaps in complete structures and prunes expired rows"""
+        response = self.client.post('/auth/register', json={
+            'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane@example.com', 'password': 'password123'})
+        data = json.loads(response.data)['data']
+        headers = {'Authorization': f"Bearer {data['accessToken']}"}
+        jti = decode_token(data['accessToken'])['jti']
+        self.client.post('/auth/logout', headers=headers)
+        db.session.add(RevokedToken(jti='expired', tokenType='access', userId=User.query.one().userId,
+                                    expiresAt=datetime.now(pytz_timezone('UTC')) - timedelta(minutes=1)))
+        db.session.commit()
+
+        seen = []
+
+        def check(conn, cursor, statement, parameters, context, executemany):
+            seen.append(revocation_list.is_revoked(jti))
+
+        revocation_list._rebuilt_at -= revocation_list.rebuild_interval + 1
+        event.listen(db.engine, 'before_cursor_execute', check)
+        try:
+            revocation_list.sync()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', check)
+
+        self.assertTrue(seen)
+        self.assertTrue(all(seen))
+        self.assertTrue(revocation_list.is_revoked(jti))
+        self.assertEqual([token.jti for token in RevokedToken.query], [jti])
+        self.assertEqual(self.client.get('/api/organisations', headers=headers).status_code, 401)
+
     def test_login_failure(self):
         """Test login failure with incorrect credentials"""
         response = self.client.post('/auth/login', json={
@@ -85,6 +266,73 @@ class AuthTestCase(unittest.TestCase):
         self.assertEqual(data['status'], 'Bad request')
         self.assertEqual(data['message'], 'Authentication failed')
 
+    def test_login_throttled(self):
+        """Test that repeated attempts for one email are rejected with 429"""
+        burst = self.app.config['LOGIN_THROTTLE_BURST']
+        for _ in range(burst):
+            response = self.client.post('/auth/login', json={
+                'email': 'victim@example.com',
+                'password': 'wrongpassword'
+            })
+            self.assertEqual(response.status_code, 401)
+
+        response = self.client.post('/auth/login', json={
+            'email': 'victim@example.com',
+            'password': 'wrongpassword'
+        })
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(json.loads(response.data)['statusCode'], 429)
+
+    def test_proxy_fix_trusts_forwarded_for(self):
+        """Test that PROXY_FIX_X_FOR makes request.remote_addr the address the proxy saw"""
+        headers = {'X-Forwarded-For': '203.0.113.7, 198.51.100.1'}
+        self.app.add_url_rule('/ip', 'ip', lambda: request.remote_addr)
+        self.assertEqual(self.client.get('/ip', headers=headers).data, b'127.0.0.1')
+
+        os.environ['PROXY_FIX_X_FOR'] = '1'
+        try:
+            app = create_app('testing')
+        finally:
+            del os.environ['PROXY_FIX_X_FOR']
+        app.add_url_rule('/ip', 'ip', lambda: request.remote_addr)
+        self.assertEqual(app.test_client().get('/ip', headers=headers).data, b'198.51.100.1')
+
+    def test_audit_events_recorded(self):
+        """Test that registration and logins are written to the audit trail in a batch"""
+        self.client.post('/auth/register', json={
+            'firstName': 'John', 'lastName': 'Doe', 'email': 'john@example.com', 'password': 'password123'})
+        self.client.post('/auth/login', json={'email': 'john@example.com', 'password': 'wrongpassword'})
+        self.client.post('/auth/login', json={'email': 'john@example.com', 'password': 'password123'})
+        self.assertEqual(AuditEvent.query.count(), 0)
+
+        audit_log.flush()
+        events = [event.event for event in AuditEvent.query.order_by(AuditEvent.id)]
+        self.assertEqual(events, ['user.registered', 'login.failed', 'login.succeeded'])
+
+    def test_audit_queue_drops_when_full(self):
+        """Test that a full audit queue drops events instead of blocking"""
+        self.app.config['AUDIT_QUEUE_SIZE'] = 2
+        audit_log.init_app(self.app)
+        for _ in range(3):
+            audit_log.emit('test.event')
+        self.assertEqual(audit_log.stats()['queued'], 2)
+        self.assertEqual(audit_log.dropped, 1)
+
+    def test_metrics_exposed(self):
+        """Test that request, query and hashing metrics are exposed in Prometheus format"""
+        self.client.post('/auth/register', json={
+            'firstName': 'John',
+            'lastName': 'Doe',
+            'email': 'john@example.com',
+            'password': 'password123'
+        })
+        response = self.client.get(self.app.config['METRICS_PATH'])
+        self.assertEqual(response.status_code, 200)
+        body = response.data.decode()
+        self.assertIn('http_request_duration_seconds_bucket{endpoint="/auth/register",method="POST",status="201"', body)
+        self.assertIn('db_queries_per_request_count{endpoint="/auth/register"}', body)
+        self.assertIn('password_hash_duration_seconds_count', body)
+
     def test_register_missing_fields(self):
         """Test registration failure when required fields are missing"""
         required_fields = ['firstName', 'lastName', 'email', 'password']
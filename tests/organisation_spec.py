@@ -0,0 +1,530 @@
+import unittest
+import json
+import os
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from threading import Thread
+from urllib.error import HTTPError
+from app import create_app, db
+from services.identity_cache import identity_cache
+from flask_jwt_extended import decode_token
+from services.membership_claims import decode_org_ids
+from services.query_budget import query_budget, query_budget_checker, count_queries, QueryBudgetExceeded
+from services.user_search import prefix_index
+from services.replica import replica_router
+from services.outbox import make_sink, relay_batch
+from models.outbox import OutboxEvent
+from models import parse_uuid
+from models.organisation import Organisation
+from models.user import User
+from services.org_cache import org_cache
+
+
+class OrganisationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+        # Setup test database
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def register(self, first_name, email, password='password123'):
+        response = self.client.post('/auth/register', json={
+            'firstName': first_name,
+            'lastName': 'Doe',
+            'email': email,
+            'password': password
+        })
+        data = json.loads(response.data)['data']
+        return data['accessToken'], data['user']['userId']
+
+    def auth(self, token):
+        return {'Authorization': f'Bearer {token}'}
+
+    def org_id(self, token):
+        response = self.client.get('/api/organisations', headers=self.auth(token))
+        return json.loads(response.data)['data']['organisations'][0]['orgId']
+
+    def test_identity_cache_hits(self):
+        """Test that repeated authenticated requests are served from the identity cache"""
+        token, _ = self.register('John', 'john@example.com')
+        self.client.get('/api/organisations', headers=self.auth(token))
+        before = identity_cache.stats()
+
+        response = self.client.get('/api/organisations', headers=self.auth(token))
+        self.assertEqual(response.status_code, 200)
+        after = identity_cache.stats()
+        self.assertEqual(after['hits'], before['hits'] + 1)
+        self.assertEqual(after['misses'], before['misses'])
+
+    def test_create_organisation_invalidates_identity(self):
+        """Test that creating an organisation shows up in the next listing"""
+        token, _ = self.register('John', 'john@example.com')
+        self.client.get('/api/organisations', headers=self.auth(token))
+
+        response = self.client.post('/api/organisations', json={'name': 'Acme', 'description': 'Widgets'},
+                                    headers=self.auth(token))
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get('/api/organisations', headers=self.auth(token))
+        names = sorted(org['name'] for org in json.loads(response.data)['data']['organisations'])
+        self.assertEqual(names, ['Acme', "John's Organisation"])
+
+    def test_get_organisations_keyset_pagination(self):
+        """Test that paging through organisations returns every org once in orgId order"""
+        token, _ = self.register('John', 'john@example.com')
+        for name in ('Acme', 'Globex', 'Initech'):
+            self.client.post('/api/organisations', json={'name': name}, headers=self.auth(token))
+
+        seen = []
+        cursor = None
+        while True:
+            query = {'limit': 2}
+            if cursor:
+                query['cursor'] = cursor
+            response = self.client.get('/api/organisations', query_string=query, headers=self.auth(token))
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.data)['data']
+            self.assertLessEqual(len(data['organisations']), 2)
+            seen.extend(org['orgId'] for org in data['organisations'])
+            cursor = data['nextCursor']
+            if not cursor:
+                break
+
+        self.assertEqual(len(seen), 4)
+        self.assertEqual(seen, sorted(set(seen)))
+
+    def test_get_organisations_invalid_cursor(self):
+        """Test that a malformed cursor is rejected"""
+        token, _ = self.register('John', 'john@example.com')
+        response = self.client.get('/api/organisations?cursor=nope', headers=self.auth(token))
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(json.loads(response.data)['errors'][0]['field'], 'cursor')
+
+    def test_add_user_to_organisation_grants_access(self):
+        """Test that a user added to an organisation can read it, and only once"""
+        john_token, _ = self.register('John', 'john@example.com')
+        jane_token, jane_id = self.register('Jane', 'jane@example.com')
+        response = self.client.post('/api/organisations', json={'name': 'Acme'}, headers=self.auth(john_token))
+        org_id = json.loads(response.data)['data']['orgId']
+
+        response = self.client.get(f'/api/organisations/{org_id}', headers=self.auth(jane_token))
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.post(f'/api/organisations/{org_id}/users', json={'userId': jane_id},
+                                    headers=self.auth(john_token))
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(f'/api/organisations/{org_id}', headers=self.auth(jane_token))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['data']['name'], 'Acme')
+
+        response = self.client.post(f'/api/organisations/{org_id}/users', json={'userId': jane_id},
+                                    headers=self.auth(john_token))
+        self.assertEqual(json.loads(response.data)['message'], 'User already in organisation')
+
+    def test_get_user_requires_shared_organisation(self):
+        """Test that user details are only visible to members of a common organisation"""
+        john_token, john_id = self.register('John', 'john@example.com')
+        jane_token, jane_id = self.register('Jane', 'jane@example.com')
+
+        response = self.client.get(f'/api/users/{john_id}', headers=self.auth(jane_token))
+        self.assertEqual(json.loads(response.data)['statusCode'], 403)
+
+        response = self.client.post('/api/organisations', json={'name': 'Acme'}, headers=self.auth(john_token))
+        org_id = json.loads(response.data)['data']['orgId']
+        self.client.post(f'/api/organisations/{org_id}/users', json={'userId': jane_id}, headers=self.auth(john_token))
+
+        response = self.client.get(f'/api/users/{john_id}', headers=self.auth(jane_token))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['data']['email'], 'john@example.com')
+
+        response = self.client.get(f'/api/users/{john_id}/organisations', headers=self.auth(jane_token))
+        shared = json.loads(response.data)['data']['organisations']
+        self.assertEqual([org['orgId'] for org in shared], [org_id])
+
+    def test_import_users_reports_row_errors(self):
+        """Test that bulk import inserts valid rows and reports invalid ones like register()"""
+        token, john_id = self.register('John', 'john@example.com')
+        self.app.config['BULK_IMPORT_ALLOWED_USERS'] = [john_id]
+        body = '\n'.join([
+            json.dumps({'firstName': 'Ann', 'lastName': 'Lee', 'email': 'ann@example.com', 'password': 'pw'}),
+            json.dumps({'firstName': 'Bob', 'lastName': 'Lee', 'email': 'john@example.com', 'password': 'pw'}),
+            json.dumps({'firstName': 'Cy', 'email': 'cy@example.com', 'password': 'pw'}),
+            'not json',
+            json.dumps({'firstName': 'Di', 'lastName': 'Lee', 'email': ['di@example.com'], 'password': 'pw'}),
+        ])
+        response = self.client.post('/api/users/import', data=body, content_type='application/x-ndjson',
+                                    headers=self.auth(token))
+        self.assertEqual(response.status_code, 200)
+        report = json.loads(response.data)['data']
+        self.assertEqual(report['imported'], 1)
+        self.assertEqual(report['failed'], 4)
+        errors = {error['row']: error['errors'][0] for error in report['errors']}
+        self.assertEqual(errors[2], {'field': 'email', 'message': 'Email already exists'})
+        self.assertEqual(errors[3], {'field': 'lastName', 'message': 'Last name is required'})
+        self.assertEqual(errors[5], {'field': 'email', 'message': 'Email must be a string'})
+
+        response = self.client.post('/auth/login', json={'email': 'ann@example.com', 'password': 'pw'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_import_users_requires_allowlist(self):
+        """Test that only BULK_IMPORT_ALLOWED_USERS can import, and only UTF-8 bodies"""
+        token, john_id = self.register('John', 'john@example.com')
+        body = json.dumps({'firstName': 'Ann', 'lastName': 'Lee', 'email': 'ann@example.com', 'password': 'pw'})
+        response = self.client.post('/api/users/import', data=body, content_type='application/x-ndjson',
+                                    headers=self.auth(token))
+        self.assertEqual(response.status_code, 403)
+        self.assertIsNone(User.query.filter_by(email='ann@example.com').first())
+
+        self.app.config['BULK_IMPORT_ALLOWED_USERS'] = [john_id]
+        response = self.client.post('/api/users/import', data=b'{"firstName": "\xff"}', content_type='application/x-ndjson',
+                                    headers=self.auth(token))
+        self.assertEqual(response.status_code, 400)
+
+    def test_import_users_row_cap(self):
+        """Test that the import endpoint rejects bodies over BULK_IMPORT_MAX_ROWS without importing"""
+        token, john_id = self.register('John', 'john@example.com')
+        self.app.config['BULK_IMPORT_ALLOWED_USERS'] = [john_id]
+        self.app.config['BULK_IMPORT_MAX_ROWS'] = 2
+        body = '\n'.join(json.dumps({'firstName': name, 'lastName': 'Lee', 'email': f'{name}@example.com', 'password': 'pw'})
+                         for name in ('ann', 'bob', 'cy'))
+        response = self.client.post('/api/users/import', data=body, content_type='application/x-ndjson',
+                                    headers=self.auth(token))
+        self.assertEqual(response.status_code, 413)
+        self.assertIsNone(User.query.filter_by(email='ann@example.com').first())
+
+    def test_add_users_to_organisation_batch(self):
+        """Test that the batch endpoint reports a status for every requested userId"""
+        john_token, _ = self.register('John', 'john@example.com')
+        _, jane_id = self.register('Jane', 'jane@example.com')
+        _, jim_id = self.register('Jim', 'jim@example.com')
+        response = self.client.post('/api/organisations', json={'name': 'Acme'}, headers=self.auth(john_token))
+        org_id = json.loads(response.data)['data']['orgId']
+        self.client.post(f'/api/organisations/{org_id}/users', json={'userId': jim_id}, headers=self.auth(john_token))
+
+        missing = '00000000-0000-0000-0000-000000000000'
+        response = self.client.post(f'/api/organisations/{org_id}/users/batch',
+                                    json={'userIds': [jane_id, jim_id, missing, 'nope']},
+                                    headers=self.auth(john_token))
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)['data']
+        self.assertEqual(data['added'], 1)
+        self.assertEqual([result['status'] for result in data['results']],
+                         ['added', 'already_member', 'not_found', 'invalid'])
+
+    def test_export_organisation_users(self):
+        """Test that members are streamed as NDJSON and that since filters them"""
+        john_token, _ = self.register('John', 'john@example.com')
+        _, jane_id = self.register('Jane', 'jane@example.com')
+        response = self.client.post('/api/organisations', json={'name': 'Acme'}, headers=self.auth(john_token))
+        org_id = json.loads(response.data)['data']['orgId']
+        self.client.post(f'/api/organisations/{org_id}/users', json={'userId': jane_id}, headers=self.auth(john_token))
+
+        response = self.client.get(f'/api/organisations/{org_id}/users/export', headers=self.auth(john_token))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        members = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual(sorted(member['email'] for member in members), ['jane@example.com', 'john@example.com'])
+
+        response = self.client.get(f'/api/organisations/{org_id}/users/export',
+                                   query_string={'since': '2999-01-01T00:00:00'}, headers=self.auth(john_token))
+        self.assertEqual(response.data, b'')
+
+    def test_get_organisation_single_query_when_identity_cached(self):
+        """Test that a cached caller needs one statement to read an organisation"""
+        token, _ = self.register('John', 'john@example.com')
+        response = self.client.get('/api/organisations', headers=self.auth(token))
+        org_id = json.loads(response.data)['data']['organisations'][0]['orgId']
+
+        with count_queries(db.engine) as statements:
+            response = self.client.get(f'/api/organisations/{org_id}', headers=self.auth(token))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(statements), 1)
+
+    def test_org_cache_serves_hot_orgs_and_invalidates_on_update(self):
+        """Test that a cached organisation needs no statements and is dropped when updated"""
+        token, _ = self.register('John', 'john@example.com')
+        response = self.client.get('/api/organisations', headers=self.auth(token))
+        org_id = json.loads(response.data)['data']['organisations'][0]['orgId']
+        self.client.get(f'/api/organisations/{org_id}', headers=self.auth(token))
+
+        with count_queries(db.engine) as statements:
+            response = self.client.get(f'/api/organisations/{org_id}', headers=self.auth(token))
+        self.assertEqual(statements, [])
+        self.assertGreater(org_cache.stats()['hitRatio'], 0)
+
+        org = db.session.get(Organisation, parse_uuid(org_id))
+        org.name = 'Renamed'
+        db.session.flush()
+        self.assertEqual(org_cache.get(org_id).name, "John's Organisation")
+        db.session.commit()
+        self.assertEqual(org_cache.get(org_id).name, 'Renamed')
+
+    def test_query_budget_exceeded_fails(self):
+        """Test that a view running more statements than its budget fails under test"""
+        @query_budget(1)
+        def chatty():
+            db.session.execute(db.text('SELECT 1'))
+            db.session.execute(db.text('SELECT 2'))
+            return 'ok'
+
+        self.app.add_url_rule('/chatty', 'chatty', chatty)
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/chatty')
+
+    def test_query_debug_follows_app_debug(self):
+        """Test that N+1 logging defaults to the app's debug flag when QUERY_DEBUG is unset"""
+        self.assertFalse(query_budget_checker.debug)
+        os.environ['FLASK_DEBUG'] = '1'
+        try:
+            app = create_app('testing')
+        finally:
+            del os.environ['FLASK_DEBUG']
+        self.assertTrue(app.debug)
+        self.assertTrue(query_budget_checker.debug)
+
+    def test_membership_claims_authorise_from_token(self):
+        """Test that a current membership claim denies foreign orgs without touching the database"""
+        john_token, _ = self.register('John', 'john@example.com')
+        jane_token, _ = self.register('Jane', 'jane@example.com')
+        response = self.client.get('/api/organisations', headers=self.auth(john_token))
+        john_org = json.loads(response.data)['data']['organisations'][0]['orgId']
+
+        claims = decode_token(jane_token)
+        self.assertEqual(claims['mv'], 0)
+        self.assertEqual(len(decode_org_ids(claims['orgs'])), 1)
+
+        self.client.get('/api/organisations', headers=self.auth(jane_token))
+        with count_queries(db.engine) as statements:
+            response = self.client.get(f'/api/organisations/{john_org}', headers=self.auth(jane_token))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(statements, [])
+
+    def test_stale_membership_claim_falls_back_to_database(self):
+        """Test that a token issued before a membership change is checked against the database"""
+        john_token, _ = self.register('John', 'john@example.com')
+        jane_token, jane_id = self.register('Jane', 'jane@example.com')
+        response = self.client.post('/api/organisations', json={'name': 'Acme'}, headers=self.auth(john_token))
+        org_id = json.loads(response.data)['data']['orgId']
+        self.client.post(f'/api/organisations/{org_id}/users', json={'userId': jane_id}, headers=self.auth(john_token))
+
+        response = self.client.get(f'/api/organisations/{org_id}', headers=self.auth(jane_token))
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_organisations_conditional_get(self):
+        """Test that a matching If-None-Match gets a 304 until the user's organisations change"""
+        token, _ = self.register('John', 'john@example.com')
+        response = self.client.get('/api/organisations', headers=self.auth(token))
+        etag = response.headers['ETag']
+
+        response = self.client.get('/api/organisations', headers={**self.auth(token), 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+        self.client.post('/api/organisations', json={'name': 'Acme'}, headers=self.auth(token))
+        response = self.client.get('/api/organisations', headers={**self.auth(token), 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_get_user_conditional_get(self):
+        """Test that GET /users/<id> answers a matching If-None-Match with 304"""
+        token, user_id = self.register('John', 'john@example.com')
+        response = self.client.get(f'/api/users/{user_id}', headers=self.auth(token))
+        etag = response.headers['ETag']
+
+        response = self.client.get(f'/api/users/{user_id}', headers={**self.auth(token), 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_search_users(self):
+        """Test prefix and substring user search with keyset pagination"""
+        token, _ = self.register('John', 'john@example.com')
+        org_id = self.org_id(token)
+        for first_name, email in (('Johanna', 'jo.hanna@example.com'), ('Jane', 'jane@example.com')):
+            _, user_id = self.register(first_name, email)
+            self.client.post(f'/api/organisations/{org_id}/users', json={'userId': user_id}, headers=self.auth(token))
+
+        response = self.client.get('/api/users/search?q=JOH&limit=1', headers=self.auth(token))
+        data = json.loads(response.data)['data']
+        self.assertEqual([user['email'] for user in data['users']], ['jo.hanna@example.com'])
+        response = self.client.get(f"/api/users/search?q=JOH&limit=1&cursor={data['nextCursor']}", headers=self.auth(token))
+        data = json.loads(response.data)['data']
+        self.assertEqual([user['email'] for user in data['users']], ['john@example.com'])
+        self.assertIsNone(data['nextCursor'])
+
+        response = self.client.get('/api/users/search?q=ann&match=contains', headers=self.auth(token))
+        self.assertEqual([user['firstName'] for user in json.loads(response.data)['data']['users']], ['Johanna'])
+
+        # LIKE wildcards in the query match literally
+        response = self.client.get('/api/users/search?q=j%25', headers=self.auth(token))
+        self.assertEqual(json.loads(response.data)['data']['users'], [])
+
+    def test_search_users_only_finds_shared_members(self):
+        """Test that a user in just their default organisation cannot search other users"""
+        self.register('John', 'john@example.com')
+        jane_token, _ = self.register('Jane', 'jane@example.com')
+
+        for match in ('prefix', 'contains'):
+            response = self.client.get(f'/api/users/search?q=joh&match={match}', headers=self.auth(jane_token))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.data)['data']['users'], [])
+
+        # Adding someone new needs their whole email
+        response = self.client.get('/api/users/search?q=joh&match=exact', headers=self.auth(jane_token))
+        self.assertEqual(json.loads(response.data)['data']['users'], [])
+        response = self.client.get('/api/users/search?q=John@Example.com&match=exact', headers=self.auth(jane_token))
+        self.assertEqual([user['email'] for user in json.loads(response.data)['data']['users']], ['john@example.com'])
+
+    def test_search_users_memory_index(self):
+        """Test that the in-memory prefix index answers with only the membership lookup"""
+        prefix_index.enabled = True
+        token, _ = self.register('John', 'john@example.com')
+        self.client.get('/api/users/search?q=jo', headers=self.auth(token))
+        _, joan_id = self.register('Joan', 'joan@example.com')
+        self.register('Joe', 'joe@example.com')
+        self.client.post(f'/api/organisations/{self.org_id(token)}/users', json={'userId': joan_id}, headers=self.auth(token))
+
+        with count_queries(db.engine) as statements:
+            response = self.client.get('/api/users/search?q=jo', headers=self.auth(token))
+        users = json.loads(response.data)['data']['users']
+        self.assertEqual([user['email'] for user in users], ['joan@example.com', 'john@example.com'])
+        self.assertEqual(len(statements), 1)
+        self.assertIn('user_organisation', statements[0])
+
+    def test_outbox_relay_to_file(self):
+        """Test that registration and membership events reach the sink once via flask outbox-relay"""
+        john_token, _ = self.register('John', 'john@example.com')
+        _, jane_id = self.register('Jane', 'jane@example.com')
+        response = self.client.get('/api/organisations', headers=self.auth(john_token))
+        org_id = json.loads(response.data)['data']['organisations'][0]['orgId']
+        self.client.post(f'/api/organisations/{org_id}/users', json={'userId': jane_id}, headers=self.auth(john_token))
+        self.assertEqual(OutboxEvent.query.count(), 3)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'events.jsonl')
+            result = self.app.test_cli_runner().invoke(args=['outbox-relay', '--sink', f'file://{path}', '--batch-size', '2'])
+            self.assertEqual(json.loads(result.output), {'delivered': 3})
+            with open(path) as handle:
+                events = [json.loads(line) for line in handle]
+        self.assertEqual([event['topic'] for event in events], ['user.registered', 'user.registered', 'membership.added'])
+        self.assertEqual(events[2]['payload']['userId'], jane_id)
+        self.assertEqual(OutboxEvent.query.count(), 0)
+
+    def test_outbox_relay_http_failure_keeps_events(self):
+        """Test that a batch rejected by the HTTP sink stays in the outbox"""
+        received = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                received.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+                self.send_response(503 if len(received) == 1 else 204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), Handler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            self.register('John', 'john@example.com')
+            sink = make_sink(f'http://127.0.0.1:{server.server_port}/events')
+            with self.assertRaises(HTTPError):
+                relay_batch(sink)
+            self.assertEqual(OutboxEvent.query.count(), 1)
+            self.assertEqual(relay_batch(sink), 1)
+        finally:
+            server.shutdown()
+        self.assertEqual(len(received), 2)
+        self.assertEqual(received[1]['events'][0]['topic'], 'user.registered')
+        self.assertEqual(OutboxEvent.query.count(), 0)
+
+
+class ReplicaRoutingTestCase(unittest.TestCase):
+    """Runs against two databases: the testing primary and an empty in-memory replica."""
+
+    def setUp(self):
+        os.environ['DATABASE_REPLICA_URLS'] = 'sqlite://'
+        try:
+            self.app = create_app('testing')
+        finally:
+            del os.environ['DATABASE_REPLICA_URLS']
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.metadata.create_all(db.engines['replica_0'])
+        identity_cache.clear()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        db.metadata.drop_all(db.engines['replica_0'])
+        identity_cache.clear()
+        self.app_context.pop()
+
+    def test_reads_go_to_replica_unless_user_recently_wrote(self):
+        """Test that GET views read from the replica, except right after the caller wrote"""
+        response = self.client.post('/auth/register', json={
+            'firstName': 'John', 'lastName': 'Doe', 'email': 'john@example.com', 'password': 'password123'})
+        token = json.loads(response.data)['data']['accessToken']
+        headers = {'Authorization': f'Bearer {token}'}
+
+        # Sticky after registering: served from the primary
+        response = self.client.get('/api/organisations', headers=headers)
+        self.assertEqual(response.status_code, 200)
+
+        # Once the window is over the (never replicated) replica answers
+        replica_router._sticky.clear()
+        identity_cache.clear()
+        response = self.client.get('/api/organisations', headers=headers)
+        self.assertEqual(json.loads(response.data)['message'], 'User not found')
+
+        # Writes always go to the primary and make the writer sticky again
+        response = self.client.post('/api/organisations', json={'name': 'Acme'}, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(replica_router.is_sticky(decode_token(token)['sub']))
+
+    def test_added_member_is_sticky_and_replica_reads_cache_briefly(self):
+        """Test that new members read from the primary and replica rows outlive no sticky window"""
+        tokens = {}
+        for name in ('John', 'Jane'):
+            response = self.client.post('/auth/register', json={
+                'firstName': name, 'lastName': 'Doe', 'email': f'{name.lower()}@example.com', 'password': 'password123'})
+            tokens[name] = json.loads(response.data)['data']['accessToken']
+        john, jane = ({'Authorization': f'Bearer {tokens[name]}'} for name in ('John', 'Jane'))
+        jane_id = decode_token(tokens['Jane'])['sub']
+        org_id = json.loads(self.client.get('/api/organisations', headers=john).data)['data']['organisations'][0]['orgId']
+
+        # Replicate the users, then let the registration stickiness lapse
+        rows = [dict(row) for row in db.session.execute(db.select(User.__table__)).mappings()]
+        with db.engines['replica_0'].begin() as connection:
+            connection.execute(User.__table__.insert(), rows)
+        replica_router._sticky.clear()
+        identity_cache.clear()
+
+        self.client.get(f'/api/users/{jane_id}', headers=jane)
+        ttl = identity_cache._cache._data[parse_uuid(jane_id)][1] - time.monotonic()
+        self.assertLessEqual(ttl, replica_router.sticky_seconds)
+
+        response = self.client.post(f'/api/organisations/{org_id}/users', json={'userId': jane_id}, headers=john)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(replica_router.is_sticky(jane_id))
+
+        # Jane's next read comes from the primary, so it sees the new membership
+        response = self.client.get(f'/api/organisations/{org_id}', headers=jane)
+        self.assertEqual(response.status_code, 200)
+        ttl = identity_cache._cache._data[parse_uuid(jane_id)][1] - time.monotonic()
+        self.assertGreater(ttl, replica_router.sticky_seconds)
+
+
+if __name__ == '__main__':
+    unittest.main()